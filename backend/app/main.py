@@ -1,3 +1,4 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -9,6 +10,7 @@ from app.routes.admin_routes import router as admin_router
 from app.routes import auth, crop, weather, market, mandi, disease
 from app.routes.market_prediction_routes import router as market_prediction_router
 from app.routes.market_sync import router as market_sync_router
+from app.routes.market_history import router as market_history_router
 
 # ================= FEATURES =================
 from app.routes.chatbot_routes import router as chat_router
@@ -93,11 +95,49 @@ app.include_router(story_router)    # ✅ ADD
 
 app.include_router(market_sync_router)
 app.include_router(market_ai_routes.router)
+app.include_router(market_history_router)
 
 from fastapi.staticfiles import StaticFiles
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# ================= ML WARM-UP =================
+# Optional: set ML_WARMUP=1 to load forecast models at startup
+@app.on_event("startup")
+def warm_up_models():
+
+    if os.getenv("ML_WARMUP", "0") != "1":
+        return
+
+    from ml.predict_ensemble import warm_up
+
+    print("🔥 ML warm-up:", warm_up())
+
+
+# ================= MARKET SYNC =================
+# Optional: set SYNC_SCHEDULER=1 to sweep the Agmarknet
+# watchlist (ml/data/sync_watchlist.json) in the background
+@app.on_event("startup")
+async def start_market_sync():
+
+    if os.getenv("SYNC_SCHEDULER", "0") != "1":
+        return
+
+    from app.services.sync_scheduler import scheduler
+
+    scheduler.start()
+
+
+# ================= OUTBOUND HTTP =================
+# Close the shared keep-alive pool cleanly
+@app.on_event("shutdown")
+def close_http_client():
+
+    from app.services.http_client import http
+
+    http.close()
+
+
 # ================= HOME =================
 @app.get("/")
 def home():
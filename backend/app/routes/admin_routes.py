@@ -3,6 +3,8 @@ from bson import ObjectId
 
 from app.database import db
 from app.services.jwt_service import get_current_user
+from app.services.sync_scheduler import scheduler
+from app.services.http_client import http
 
 
 router = APIRouter(
@@ -71,3 +73,34 @@ def get_admin_stats():
         "reviews": reviews,
         "stories": stories
     }
+
+
+# ======================
+# MARKET SYNC SCHEDULER
+# ======================
+@router.get("/market-sync/status", dependencies=[Depends(admin_only)])
+def market_sync_status():
+    return scheduler.status()
+
+
+@router.post("/market-sync/run", status_code=202, dependencies=[Depends(admin_only)])
+async def market_sync_run():
+
+    # wake the background loop, or start a one-off run; a sweep
+    # can take minutes, so never inside the request
+    scheduler.run_in_background()
+
+    return {
+        "message": "Sync started",
+        "status_url": "/api/admin/market-sync/status",
+        "status": scheduler.status(),
+    }
+
+
+# ======================
+# OUTBOUND HTTP
+# ======================
+@router.get("/http-status", dependencies=[Depends(admin_only)])
+def http_status():
+    # per-host request / retry counters and circuit state
+    return http.status()
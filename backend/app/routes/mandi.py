@@ -1,10 +1,18 @@
 import os
-import requests
 from fastapi import APIRouter, Query, HTTPException
 from dotenv import load_dotenv
-from datetime import datetime
-from functools import lru_cache
-from math import radians, sin, cos, sqrt, atan2
+from typing import List
+import asyncio
+import heapq
+import numpy as np
+
+from app.services.http_client import http, UpstreamError
+from app.services.ttl_cache import TTLCache, make_backend
+from app.services.mandi_index import get_mandi_index
+from app.services.geocode_cache import geocode_mandi, geocode_cache
+from app.services.routing import haversine, route, road_factor, route_cache
+from app.services.net_realization import CostModel, estimate_roads, score
+from app.services.agmarknet_batch import batch_for, stamp
 
 
 # =========================
@@ -19,6 +27,27 @@ DATA_GOV_API_KEY = os.getenv("DATA_GOV_API_KEY")
 
 RESOURCE_ID = "9ef84268-d588-465a-a308-a864a43d0070"
 
+# Agmarknet updates a few times a day: serve a commodity's
+# records from cache for CACHE_TTL, then stale for up to
+# CACHE_STALE while one background refresh runs.
+FETCH_LIMIT = 700
+
+CACHE_TTL = int(os.getenv("MANDI_CACHE_TTL", "1800"))
+CACHE_STALE = int(os.getenv("MANDI_CACHE_STALE", "21600"))
+
+records_cache = TTLCache(
+    name="agmarknet-records",
+    ttl=CACHE_TTL,
+    stale_ttl=CACHE_STALE,
+    backend=make_backend(
+        os.getenv("MANDI_CACHE_BACKEND", "memory"),   # memory | redis
+        url=os.getenv("MANDI_CACHE_REDIS_URL"),
+        prefix="mandi:records:",
+    ),
+    # upstream errors are returned, never cached
+    cacheable=lambda data: "error" not in data,
+)
+
 
 # =========================
 # VERIFIED MANDI LOCATIONS
@@ -38,6 +67,10 @@ MANDI_COORDS = {
 }
 
 
+# major APMC markets (bundled CSV, BallTree)
+mandi_index = get_mandi_index()
+
+
 MANDI_LIST = [
     {"name": "Pune", "state": "Maharashtra"},
     {"name": "Nashik", "state": "Maharashtra"},
@@ -47,33 +80,51 @@ MANDI_LIST = [
 ]
 
 
-# =========================
-# HELPERS
-# =========================
+# every mandi in the index, for net-realization ranking
+# (bundled APMC list, verified coords win)
+NET_MANDIS = [
+    {"name": name, "state": state}
+    for name, state in zip(mandi_index.names, mandi_index.states)
+]
 
-def normalize(s: str):
-    return (s or "").strip().lower()
+NET_LATS = mandi_index.lats.copy()
+NET_LONS = mandi_index.lons.copy()
 
+for i, m in enumerate(NET_MANDIS):
+    if m["name"] in MANDI_COORDS:
+        NET_LATS[i], NET_LONS[i] = MANDI_COORDS[m["name"]]
 
-def parse_date(date_str):
+# normalized names, matched against Agmarknet markets (built once)
+NET_NEEDLES = tuple(m["name"].strip().lower() for m in NET_MANDIS)
 
-    if not date_str:
-        return None
+# repeat queries from the same ~5 km cell share one answer
+NET_GRID = float(os.getenv("NET_RANK_GRID_DEG", "0.05"))
 
-    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
-        try:
-            return datetime.strptime(date_str.strip(), fmt)
-        except:
-            pass
+net_cache = TTLCache(
+    name="net-realization",
+    ttl=int(os.getenv("NET_RANK_CACHE_TTL", "300")),
+    backend=make_backend(
+        os.getenv("MANDI_CACHE_BACKEND", "memory"),
+        url=os.getenv("MANDI_CACHE_REDIS_URL"),
+        prefix="mandi:net:",
+        max_entries=2048,
+    ),
+)
 
-    return None
+
+# =========================
+# HELPERS
+# =========================
+
+def normalize(s: str):
+    return (s or "").strip().lower()
 
 
 # =========================
 # DATA.GOV FETCH
 # =========================
 
-def fetch_records(commodity: str, limit: int = 500):
+async def fetch_records(commodity: str, limit: int = 500):
 
     if not DATA_GOV_API_KEY:
         return {"error": "DATA_GOV_API_KEY missing"}
@@ -89,15 +140,20 @@ def fetch_records(commodity: str, limit: int = 500):
 
     try:
 
-        res = requests.get(url, params=params, timeout=20)
+        # pooled keep-alive client (retries + circuit breaker)
+        return await http.get_json(url, params=params, timeout=20)
+
+    except UpstreamError as e:
 
-        if res.status_code != 200:
+        if e.status_code is not None:
             return {
                 "error": "Govt API error",
-                "raw": res.text
+                "raw": e.body
             }
 
-        return res.json()
+        return {
+            "error": f"Request failed: {str(e)}"
+        }
 
     except Exception as e:
 
@@ -106,130 +162,96 @@ def fetch_records(commodity: str, limit: int = 500):
         }
 
 
-def clean_record(r):
+async def cached_records(commodity: str):
+    """
+    One cache entry per commodity shared by /rates and /best-mandi
+    """
 
-    return {
-        "market": r.get("market"),
-        "district": r.get("districtname"),
-        "state": r.get("statename"),
-        "commodity": r.get("commodity"),
-        "variety": r.get("variety"),
-        "arrival_date": r.get("arrival_date"),
-
-        "min_price": float(r.get("min_price", 0) or 0),
-        "max_price": float(r.get("max_price", 0) or 0),
-        "modal_price": float(r.get("modal_price", 0) or 0),
-
-        "unit": "₹/Quintal",
-    }
+    async def fetch():
+        # digest rides along with the entry (see batch_for)
+        return stamp(await fetch_records(commodity, limit=FETCH_LIMIT))
+
+    return await records_cache.get_or_fetch(
+        normalize(commodity),
+        fetch
+    )
 
 
 # =========================
 # GEO HELPERS (Fallback OSM)
 # =========================
+# geocode_mandi: persistent SQLite cache in front of
+# Nominatim (see app/services/geocode_cache.py)
 
-@lru_cache(maxsize=128)
-def geocode_mandi(mandi: str, state: str):
 
-    queries = [
-        f"{mandi} APMC {state} India",
-        f"{mandi} mandi {state} India",
-        f"{mandi} market {state} India",
-        f"{mandi} {state} India",
-        f"{mandi} India",
-    ]
+# =========================
+# DISTANCE HELPERS
+# =========================
 
-    url = "https://nominatim.openstreetmap.org/search"
+# haversine / OSRM routing / route cache / road-factor
+# fallback live in app/services/routing.py
 
-    headers = {
-        "User-Agent": "SmartAgriAI/1.0"
-    }
+MAX_MATRIX = 25
 
-    for q in queries:
 
-        params = {
-            "q": q,
-            "format": "json",
-            "limit": 1,
-        }
+async def resolve_mandi(mandi: str, state: str):
+    """
+    (lat, lon, provider) or None
+    """
 
-        try:
+    mandi_name = mandi.strip()
 
-            res = requests.get(
-                url,
-                params=params,
-                headers=headers,
-                timeout=10,
-            )
+    # ✅ Use verified DB first
+    if mandi_name in MANDI_COORDS:
+        return (*MANDI_COORDS[mandi_name], "Internal DB")
 
-            if res.status_code != 200:
-                continue
+    # ✅ Bundled APMC dataset
+    coords = mandi_index.lookup(mandi_name)
 
-            data = res.json()
+    if coords:
+        return (*coords, "APMC dataset")
 
-            if data:
-                return float(data[0]["lat"]), float(data[0]["lon"])
+    # ✅ Fallback OSM (persistent cache)
+    coords = await geocode_mandi(mandi, state)
 
-        except:
-            continue
+    if coords:
+        return (*coords, "OSM")
 
     return None
 
 
-# =========================
-# DISTANCE HELPERS
-# =========================
+async def distance_to(lat, lon, mandi, state):
 
-def haversine(lat1, lon1, lat2, lon2):
+    resolved = await resolve_mandi(mandi, state)
 
-    R = 6371
-
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
+    if resolved is None:
+        return None
 
-    a = (
-        sin(dlat / 2) ** 2
-        + cos(radians(lat1))
-        * cos(radians(lat2))
-        * sin(dlon / 2) ** 2
-    )
+    mandi_lat, mandi_lon, provider = resolved
 
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    air = haversine(lat, lon, mandi_lat, mandi_lon)
 
-    return round(R * c, 2)
+    # cached / live OSRM, else haversine x learned road factor
+    r = await route(lat, lon, mandi_lat, mandi_lon)
 
+    return {
+        "mandi": mandi,
+        "state": state,
 
-def get_osm_route(lat1, lon1, lat2, lon2):
+        "air_distance_km": air,
+        "road_distance_km": r["distance_km"],
+        "travel_time_min": r["duration_min"],
+        "route_source": r["source"],
 
-    url = f"https://router.project-osrm.org/route/v1/driving/{lon1},{lat1};{lon2},{lat2}"
+        "mandi_lat": mandi_lat,
+        "mandi_lon": mandi_lon,
+        "user_lat": lat,
+        "user_lon": lon,
 
-    params = {
-        "overview": "false",
-        "steps": "false",
+        "provider": provider,
+        "status": "OK",
     }
 
-    try:
-
-        res = requests.get(url, params=params, timeout=15)
-
-        if res.status_code != 200:
-            return None
-
-        data = res.json()
-
-        if data.get("code") != "Ok":
-            return None
-
-        route = data["routes"][0]
-
-        return {
-            "distance_km": round(route["distance"] / 1000, 2),
-            "duration_min": round(route["duration"] / 60, 1),
-        }
-
-    except:
-        return None
-
 
 # =========================
 # APIs
@@ -238,69 +260,52 @@ def get_osm_route(lat1, lon1, lat2, lon2):
 
 # ✅ LIVE MANDI RATES
 @router.get("/rates")
-def get_mandi_rates(
+async def get_mandi_rates(
     commodity: str = Query(...),
     market: str = Query(...),
 ):
 
-    data = fetch_records(commodity)
+    data = await cached_records(commodity)
 
     if "error" in data:
         return data
 
-    records = data.get("records", [])
+    # columnar batch, decoded once per cached payload
+    batch = batch_for(data)
 
-    market_norm = normalize(market)
+    rows = batch.match_market(market)
 
-    filtered = [
-        clean_record(r)
-        for r in records
-        if market_norm in normalize(r.get("market"))
-    ]
-
-    filtered.sort(
-        key=lambda x: parse_date(x.get("arrival_date")) or datetime.min,
-        reverse=True,
-    )
+    top = batch.newest_first(rows, 15)
 
     return {
         "commodity": commodity,
         "market": market,
-        "count": len(filtered),
-        "results": filtered[:15],
+        "count": len(rows),
+        "results": batch.to_dicts(top),
         "status": "OK",
     }
 
 
-# ✅ BEST MANDI TODAY
-@router.get("/best-mandi")
-def best_mandi_today(
-    commodity: str = Query(...),
-):
-
-    data = fetch_records(commodity, limit=700)
+# =========================
+# BEST MANDI RANKER
+# =========================
 
-    if "error" in data:
-        return data
+def rank_mandis(batch, mandis, top=3):
+    """
+    (ranking in `mandis` order, top-k by modal price)
+    """
 
-    records = data.get("records", [])
+    # substring match over distinct markets, newest row per mandi
+    rows = batch.latest_matching(tuple(normalize(m["name"]) for m in mandis))
 
     ranking = []
 
-    for mandi in MANDI_LIST:
-
-        mandi_name = mandi["name"]
-        mandi_norm = normalize(mandi_name)
-
-        mandi_records = [
-            r for r in records
-            if mandi_norm in normalize(r.get("market"))
-        ]
+    for mandi, i in zip(mandis, rows):
 
-        if not mandi_records:
+        if i < 0:
 
             ranking.append({
-                "mandi": mandi_name,
+                "mandi": mandi["name"],
                 "status": "No data",
                 "arrival_date": None,
                 "modal_price": None,
@@ -309,24 +314,34 @@ def best_mandi_today(
 
             continue
 
-        mandi_records.sort(
-            key=lambda r: parse_date(r.get("arrival_date")) or datetime.min,
-            reverse=True,
-        )
-
-        latest = mandi_records[0]
-
         ranking.append({
-            "mandi": mandi_name,
+            "mandi": mandi["name"],
             "status": "OK",
-            "arrival_date": latest.get("arrival_date"),
-            "modal_price": float(latest.get("modal_price", 0) or 0),
+            "arrival_date": batch.arrival_date[i],
+            "modal_price": float(batch.modal_price[i]),
             "unit": "₹/Quintal",
         })
 
     valid = [x for x in ranking if x["modal_price"] not in [None, 0]]
 
-    if not valid:
+    return ranking, heapq.nlargest(top, valid, key=lambda x: x["modal_price"])
+
+
+# ✅ BEST MANDI TODAY
+@router.get("/best-mandi")
+async def best_mandi_today(
+    commodity: str = Query(...),
+    top: int = Query(3, ge=1, le=50),
+):
+
+    data = await cached_records(commodity)
+
+    if "error" in data:
+        return data
+
+    ranking, top_mandis = rank_mandis(batch_for(data), MANDI_LIST, top)
+
+    if not top_mandis:
 
         return {
             "commodity": commodity,
@@ -334,68 +349,220 @@ def best_mandi_today(
             "ranking": ranking,
         }
 
-    best = sorted(valid, key=lambda x: x["modal_price"], reverse=True)[0]
-
     return {
         "commodity": commodity,
-        "best_mandi": best,
+        "best_mandi": top_mandis[0],
+        "top": top_mandis,
         "ranking": ranking,
         "status": "OK",
     }
 
 
+# ✅ NEAREST MANDIS (offline, spatial index)
+@router.get("/nearby")
+async def nearby_mandis(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=50),
+    state: str = Query(None),
+):
+
+    results = mandi_index.nearest(lat, lon, k, state)
+
+    return {
+        "user_lat": lat,
+        "user_lon": lon,
+        "count": len(results),
+        "results": results,
+        "status": "OK",
+    }
+
+
+# ✅ BEST MANDI BY NET REALIZATION (price - transport)
+def _bucket(x):
+    return round(round(x / NET_GRID) * NET_GRID, 6)
+
+
+async def rank_net(batch, lat, lon, quantity_qtl, top, cost_model, refine):
+
+    # newest row per mandi, one pass over the distinct markets
+    rows = batch.latest_matching(NET_NEEDLES)
+
+    has = rows >= 0
+
+    # no data / zero price -> NaN (ranked last, dropped)
+    prices = np.full(len(NET_MANDIS), np.nan)
+    prices[has] = batch.modal_price[rows[has]]
+    prices[prices == 0] = np.nan
+
+    # every mandi at once: haversine x learned road factor
+    air, road, minutes = estimate_roads(
+        lat, lon, NET_LATS, NET_LONS,
+        road_factor.factor, road_factor.speed_kmh
+    )
+
+    transport, net, order = score(prices, road, quantity_qtl, cost_model)
+
+    sources = np.full(len(NET_MANDIS), "estimate", dtype=object)
+
+    # real (cached) routes for the leaders, then re-score
+    if refine:
+
+        leaders = [i for i in order[:top] if not np.isnan(net[i])]
+
+        routes = await asyncio.gather(*[
+            route(lat, lon, NET_LATS[i], NET_LONS[i]) for i in leaders
+        ])
+
+        for i, r in zip(leaders, routes):
+            road[i] = r["distance_km"]
+            minutes[i] = r["duration_min"]
+            sources[i] = r["source"]
+
+        transport, net, order = score(prices, road, quantity_qtl, cost_model)
+
+    results = []
+
+    for i in order[:top]:
+
+        if np.isnan(net[i]):
+            break
+
+        results.append({
+            "mandi": NET_MANDIS[i]["name"],
+            "state": NET_MANDIS[i]["state"],
+            "arrival_date": batch.arrival_date[rows[i]],
+            "modal_price": round(float(prices[i]), 2),
+            "air_distance_km": round(float(air[i]), 2),
+            "road_distance_km": round(float(road[i]), 2),
+            "travel_time_min": round(float(minutes[i]), 1),
+            "route_source": sources[i],
+            "transport_cost_qtl": round(float(transport[i]), 2),
+            "net_price_qtl": round(float(net[i]), 2),
+            "unit": "₹/Quintal",
+        })
+
+    return results
+
+
+@router.get("/best-mandi-net")
+async def best_mandi_net(
+    commodity: str = Query(...),
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    quantity_qtl: float = Query(10, gt=0, le=10000),
+    rate_per_km: float = Query(None, gt=0),
+    top: int = Query(5, ge=1, le=25),
+    refine: bool = Query(True, description="route the leaders via OSRM"),
+):
+
+    data = await cached_records(commodity)
+
+    if "error" in data:
+        return data
+
+    cost_model = CostModel() if rate_per_km is None else CostModel(rate_per_km=rate_per_km)
+
+    blat, blon = _bucket(lat), _bucket(lon)
+
+    batch = batch_for(data)
+
+    # payload digest: a sync with new prices misses the cache
+    key = "|".join(map(str, (
+        normalize(commodity), batch.digest, blat, blon,
+        quantity_qtl, cost_model.rate_per_km, top, refine
+    )))
+
+    results = await net_cache.get_or_fetch(
+        key,
+        lambda: rank_net(
+            batch, blat, blon,
+            quantity_qtl, top, cost_model, refine
+        )
+    )
+
+    return {
+        "commodity": commodity,
+        "origin_bucket": {"lat": blat, "lon": blon},
+        "quantity_qtl": quantity_qtl,
+        "cost_model": cost_model.to_dict(),
+        "best_mandi": results[0] if results else None,
+        "ranking": results,
+        "status": "OK" if results else "No data",
+    }
+
+
+# ✅ CACHE METRICS
+@router.get("/cache-stats")
+def cache_stats():
+    return {
+        **records_cache.stats(),
+        "geocode": geocode_cache.stats(),
+        "routes": route_cache.stats(),
+        "net_realization": net_cache.stats(),
+    }
+
+
 # ✅ DISTANCE + ROUTE (FIXED)
 @router.get("/distance")
-def mandi_distance(
+async def mandi_distance(
     lat: float = Query(...),
     lon: float = Query(...),
     mandi: str = Query(...),
     state: str = Query("Maharashtra"),
 ):
 
-    mandi_name = mandi.strip()
-
-    # ✅ Use verified DB first
-    if mandi_name in MANDI_COORDS:
+    result = await distance_to(lat, lon, mandi, state)
 
-        mandi_lat, mandi_lon = MANDI_COORDS[mandi_name]
+    if result is None:
+        raise HTTPException(404, "Mandi location not found")
 
-        provider = "Internal DB"
+    return result
 
-    # ✅ Fallback OSM
-    else:
 
-        coords = geocode_mandi(mandi, state)
+# ✅ DISTANCE MATRIX (one origin, many mandis, concurrent)
+@router.get("/distance-matrix")
+async def mandi_distance_matrix(
+    lat: float = Query(...),
+    lon: float = Query(...),
+    mandis: List[str] = Query(..., description="repeat or comma-separate"),
+    state: str = Query("Maharashtra"),
+):
 
-        if not coords:
-            raise HTTPException(404, "Mandi location not found")
+    names = []
 
-        mandi_lat, mandi_lon = coords
+    for m in mandis:
+        names += [x.strip() for x in m.split(",") if x.strip()]
 
-        provider = "OSM"
+    names = list(dict.fromkeys(names))
 
+    if not names:
+        raise HTTPException(400, "At least one mandi required")
 
-    air = haversine(lat, lon, mandi_lat, mandi_lon)
+    if len(names) > MAX_MATRIX:
+        raise HTTPException(400, f"At most {MAX_MATRIX} mandis per request")
 
-    route = get_osm_route(lat, lon, mandi_lat, mandi_lon)
+    found = await asyncio.gather(*[
+        distance_to(lat, lon, name, state) for name in names
+    ])
 
-    if not route:
-        raise HTTPException(500, "Routing service failed")
+    results = [
+        r if r is not None else {
+            "mandi": name,
+            "state": state,
+            "status": "Location not found",
+        }
+        for name, r in zip(names, found)
+    ]
 
+    ok = [r for r in results if r["status"] == "OK"]
 
     return {
-        "mandi": mandi,
-        "state": state,
-
-        "air_distance_km": air,
-        "road_distance_km": route["distance_km"],
-        "travel_time_min": route["duration_min"],
-
-        "mandi_lat": mandi_lat,
-        "mandi_lon": mandi_lon,
         "user_lat": lat,
         "user_lon": lon,
-
-        "provider": provider,
+        "count": len(results),
+        "results": results,
+        "nearest": min(ok, key=lambda r: r["road_distance_km"]) if ok else None,
+        "road_model": road_factor.status(),
         "status": "OK",
     }
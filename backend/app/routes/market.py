@@ -1,67 +1,182 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
 import json
 import os
+import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from ml.price_index import get_price_index
+from ml.analytics import ohlc, lttb
+
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 router = APIRouter(prefix="/api/market", tags=["Market"])
 
-# ✅ Fake realtime dataset (for demo)
-# Later you can replace with DB + Govt API
-MARKET_DATA = {
-    "Pune": {
-        "Onion": [
-            {"date": "2026-01-10", "price": 1800},
-            {"date": "2026-01-11", "price": 1900},
-            {"date": "2026-01-12", "price": 2100},
-            {"date": "2026-01-13", "price": 2050},
-            {"date": "2026-01-14", "price": 2200},
-            {"date": "2026-01-15", "price": 2150},
-        ],
-        "Tomato": [
-            {"date": "2026-01-10", "price": 900},
-            {"date": "2026-01-11", "price": 920},
-            {"date": "2026-01-12", "price": 880},
-            {"date": "2026-01-13", "price": 950},
-            {"date": "2026-01-14", "price": 1000},
-            {"date": "2026-01-15", "price": 980},
-        ],
-    },
-    "Nashik": {
-        "Onion": [
-            {"date": "2026-01-10", "price": 2000},
-            {"date": "2026-01-11", "price": 2050},
-            {"date": "2026-01-12", "price": 2150},
-            {"date": "2026-01-13", "price": 2250},
-            {"date": "2026-01-14", "price": 2400},
-            {"date": "2026-01-15", "price": 2500},
-        ]
-    },
-    "Solapur": {
-        "Onion": [
-            {"date": "2026-01-10", "price": 1500},
-            {"date": "2026-01-11", "price": 1600},
-            {"date": "2026-01-12", "price": 1700},
-            {"date": "2026-01-13", "price": 1650},
-            {"date": "2026-01-14", "price": 1750},
-            {"date": "2026-01-15", "price": 1800},
-        ]
-    },
-}
+# ================= PRICE HISTORY =================
+# /trend serves the stored price history from the shared
+# price index, downsampled server-side:
+#
+#   interval   daily | weekly | monthly OHLC buckets
+#   points     LTTB target for charts (on the close)
+#
+# ETag / Last-Modified follow the store's _version.json, so
+# the dashboard revalidates with a 304 instead of refetching.
+
+index = get_price_index()
+
+TREND_DAYS = 90
+
+
+def resolve_mandi(crop, mandi):
+    """
+    Exact (case-insensitive) series name, else first substring match
+    """
+
+    names = index.mandis(crop, contains=mandi)
+
+    for m in names:
+        if m.lower() == (mandi or "").lower():
+            return m
+
+    return names[0] if names else None
+
+
+def store_modified():
+    """
+    Last write to the store, truncated to seconds (HTTP dates)
+    """
+
+    try:
+        ts = os.stat(index.store.version_path).st_mtime
+    except OSError:
+        return None
+
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc)
+
+
+def not_modified(request, etag, modified):
+
+    inm = request.headers.get("if-none-match")
+
+    # If-None-Match wins over If-Modified-Since (RFC 9110)
+    if inm is not None:
+        tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+        return "*" in tags or etag in tags
+
+    ims = request.headers.get("if-modified-since")
+
+    if ims and modified is not None:
+        try:
+            return modified <= parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def trend_rows(series, interval, points):
+
+    buckets = ohlc(
+        series.dates, series.prices, interval,
+        volume=series.values.get("arrivals")
+    )
+
+    keep = lttb(
+        buckets["date"].astype(np.int64), buckets["close"], points
+    ) if points else np.arange(len(buckets["date"]))
+
+    rows = []
+
+    for i in keep:
+
+        row = {
+            "date": str(buckets["date"][i]),
+            "price": round(float(buckets["close"][i]), 2),
+        }
+
+        if interval != "daily":
+            row.update(
+                open=round(float(buckets["open"][i]), 2),
+                high=round(float(buckets["high"][i]), 2),
+                low=round(float(buckets["low"][i]), 2),
+                close=row["price"],
+                days=int(buckets["count"][i]),
+            )
+
+        if "volume" in buckets:
+            row["arrivals"] = round(float(buckets["volume"][i]), 2)
+
+        rows.append(row)
+
+    return rows
 
 
 @router.get("/trend")
-def get_market_trend(crop: str = "Onion", mandi: str = "Pune"):
+def get_market_trend(
+    request: Request,
+    crop: str = "Onion",
+    mandi: str = "Pune",
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    days: int = Query(TREND_DAYS, ge=1, le=3660, description="used when start is not given"),
+    interval: str = Query("daily", pattern="^(daily|weekly|monthly)$"),
+    points: Optional[int] = Query(None, ge=3, le=5000, description="LTTB target"),
+):
     """
     ✅ Returns price trend graph data
     """
-    trend = MARKET_DATA.get(mandi, {}).get(crop, [])
-    return {"crop": crop, "mandi": mandi, "trend": trend}
+
+    if start and end and start > end:
+        raise HTTPException(400, "start must be on or before end")
+
+    name = resolve_mandi(crop, mandi)
+
+    key = "|".join(map(str, (
+        index.version, crop, name, start, end, days, interval, points
+    )))
+
+    etag = '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+    modified = store_modified()
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+
+    if not_modified(request, etag, modified):
+        return Response(status_code=304, headers=headers)
+
+    series = index.get(crop, name) if name else None
+
+    trend = []
+
+    if series is not None and len(series):
+
+        if start is None:
+            last = series.dates[-1] if end is None else np.datetime64(end, "D")
+            start = (last - np.timedelta64(days - 1, "D")).astype(object)
+
+        series = series.between(start, end)
+
+        trend = trend_rows(series, interval, points)
+
+    return JSONResponse(
+        {
+            "crop": crop,
+            "mandi": name or mandi,
+            "interval": interval,
+            "trend": trend,
+        },
+        headers=headers,
+    )
 
 
 class SellRequest(BaseModel):
@@ -1,84 +1,93 @@
 from fastapi import APIRouter, HTTPException
-import pandas as pd
-import os
+from typing import Optional
 from datetime import datetime
 import random
 
+from ml.price_index import get_price_index
+from ml.analytics import get_signal_table, signal_rows, WINDOW, MIN_POINTS
+
 router = APIRouter(
     prefix="/api/market",
     tags=["Market AI"]
 )
 
-# ================= PATH =================
+# ================= STORE =================
 
-BASE_DIR = os.path.dirname(
-    os.path.dirname(
-        os.path.dirname(__file__)
-    )
-)
+# sorted per-series arrays, rebuilt only when the store changes
+index = get_price_index()
 
-CSV_PATH = os.path.join(
-    BASE_DIR,
-    "ml",
-    "data",
-    "mandi_data.csv"
-)
+# trend / volatility / bands per series, cached per data version
+signals = get_signal_table()
 
-print("📁 AI CSV Path:", CSV_PATH)
+print("📁 AI Store Path:", index.store.root)
 
 
 # ================= HELPERS =================
 
-def load_csv(crop, mandi):
+def load_series(crop, mandi, n=20):
+
+    # mandi is matched case-insensitively as a substring;
+    # every matching series contributes its own tail
+    parts = [
+        index.tail(crop, m, n)
+        for m in index.mandis(crop, contains=mandi)
+    ]
 
-    if not os.path.exists(CSV_PATH):
-        return []
+    records = [r for s in parts for r in s.records()]
 
-    df = pd.read_csv(CSV_PATH)
+    records.sort(key=lambda r: r["date"])
 
-    # Fix mixed date format
-    df["date"] = pd.to_datetime(
-        df["date"],
-        format="mixed",
-        dayfirst=True,
-        errors="coerce"
-    )
+    return records[-n:]
 
-    df = df.dropna(subset=["date"])
 
-    data = df[
-        (df["crop"] == crop) &
-        (df["mandi"].str.contains(mandi, case=False, na=False))
-    ]
+def load_signal(crop, mandi):
+    """
+    Precomputed signal for one mandi; ad-hoc for a substring
+    that matches several (their tails merged by date)
+    """
+
+    mandis = index.mandis(crop, contains=mandi)
+
+    if not mandis:
+        return None
 
-    data = data.sort_values("date")
+    if len(mandis) == 1:
+        return signals.get(crop, mandis[0])
 
-    return data.tail(20).to_dict("records")
+    records = load_series(crop, mandi, WINDOW)
 
+    return signal_rows([[r["modal_price"] for r in records]])[0]
 
-def analyze_trend(prices):
 
-    first = prices[0]
-    last = prices[-1]
+def decide(trend, change, volatility):
+
+    if trend == "UP" and volatility < 20:
+
+        recommendation = "Hold crop, sell later"
+        best_day = "After 2–3 days"
+        confidence = min(95, int(80 + abs(change)))
+
+        reason = f"Uptrend ({change:.2f}%) + stable market"
 
-    change = ((last - first) / max(first, 1)) * 100
 
-    if change > 2:
-        return "UP", change
+    elif trend == "DOWN":
 
-    if change < -2:
-        return "DOWN", change
+        recommendation = "Sell immediately"
+        best_day = "Today / Tomorrow"
+        confidence = min(95, int(85 + abs(change)))
 
-    return "SIDEWAYS", change
+        reason = f"Downtrend ({change:.2f}%) detected"
 
 
-def calc_volatility(prices):
+    else:
 
-    avg = sum(prices) / len(prices)
+        recommendation = "Sell gradually"
+        best_day = "Next 1–2 days"
+        confidence = random.randint(65, 75)
 
-    var = sum((p - avg) ** 2 for p in prices) / len(prices)
+        reason = "Sideways market with mixed signals"
 
-    return (var ** 0.5 / max(avg, 1)) * 100
+    return recommendation, best_day, confidence, reason
 
 
 # ================= API =================
@@ -94,9 +103,9 @@ def best_sell_time(data: dict):
 
     print("🔥 AI REQUEST:", crop, mandi)
 
-    records = load_csv(crop, mandi)
+    signal = load_signal(crop, mandi)
 
-    if len(records) < 5:
+    if signal is None or signal["points"] < MIN_POINTS:
         return {
             "ai_result": {
                 "recommendation": "Collect more data",
@@ -107,17 +116,15 @@ def best_sell_time(data: dict):
             }
         }
 
-    prices = [float(x["modal_price"]) for x in records]
-    dates = [x["date"].strftime("%Y-%m-%d") for x in records]
-
-    avg = round(sum(prices) / len(prices), 2)
-    last = prices[-1]
-    high = max(prices)
-    low = min(prices)
+    avg = signal["average_price"]
+    last = signal["last_price"]
+    high = signal["highest"]
+    low = signal["lowest"]
 
-    trend, change = analyze_trend(prices)
+    trend = signal["trend"]
+    change = signal["change_pct"]
 
-    volatility = calc_volatility(prices)
+    volatility = signal["volatility"]
 
     # 🔁 Real-time factor (changes every hour)
     hour = datetime.now().hour
@@ -127,31 +134,7 @@ def best_sell_time(data: dict):
 
     # ================= DECISION =================
 
-    if trend == "UP" and volatility < 20:
-
-        recommendation = "Hold crop, sell later"
-        best_day = "After 2–3 days"
-        confidence = min(95, int(80 + abs(change)))
-
-        reason = f"Uptrend ({change:.2f}%) + stable market"
-
-
-    elif trend == "DOWN":
-
-        recommendation = "Sell immediately"
-        best_day = "Today / Tomorrow"
-        confidence = min(95, int(85 + abs(change)))
-
-        reason = f"Downtrend ({change:.2f}%) detected"
-
-
-    else:
-
-        recommendation = "Sell gradually"
-        best_day = "Next 1–2 days"
-        confidence = random.randint(65, 75)
-
-        reason = "Sideways market with mixed signals"
+    recommendation, best_day, confidence, reason = decide(trend, change, volatility)
 
 
     # ================= RESPONSE =================
@@ -169,7 +152,35 @@ def best_sell_time(data: dict):
             "highest": high,
             "lowest": low,
             "trend": trend,
+            "volatility": volatility,
+            "support": signal["support"],
+            "resistance": signal["resistance"],
+            "ewma_trend": signal["ewma_trend"],
 
             "generated_at": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
         }
     }
+
+
+# ================= BULK SIGNALS =================
+
+@router.get("/signals")
+def all_signals(crop: Optional[str] = None):
+    """
+    Trend / volatility / support-resistance for every tracked
+    series (optionally one crop), straight from the cache
+    """
+
+    rows = signals.all(crop=crop)
+
+    for row in rows:
+        row["recommendation"] = decide(
+            row["trend"], row["change_pct"], row["volatility"]
+        )[0]
+
+    return {
+        "version": signals.version,
+        "window": WINDOW,
+        "count": len(rows),
+        "signals": rows,
+    }
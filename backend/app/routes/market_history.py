@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import date
+import re
+
+from ml.store import get_store, COLUMNS
+
+router = APIRouter(
+    prefix="/api/market",
+    tags=["Market History"]
+)
+
+
+# ================= STORE =================
+
+store = get_store()
+
+BATCH_ROWS = 10_000
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# ================= HELPERS =================
+
+def _csv_chunks(batches, columns):
+
+    yield ",".join(columns) + "\n"
+
+    for df in batches:
+        yield df.to_csv(index=False, header=False, date_format="%Y-%m-%d")
+
+
+def _ndjson_chunks(batches):
+
+    for df in batches:
+
+        if "date" in df.columns:
+            df = df.assign(date=df["date"].dt.strftime("%Y-%m-%d"))
+
+        text = df.to_json(orient="records", lines=True, force_ascii=False)
+
+        yield text if text.endswith("\n") else text + "\n"
+
+
+# ================= API =================
+
+@router.get("/history/export")
+def export_history(
+    crop: Optional[List[str]] = Query(None, description="repeat for several"),
+    mandi: Optional[List[str]] = Query(None, description="repeat for several"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    columns: Optional[List[str]] = Query(None),
+):
+    """
+    Streams matching price history from the market store,
+    one Parquet batch at a time (chunked transfer encoding),
+    so memory use does not grow with the size of the export.
+    """
+
+    if start and end and start > end:
+        raise HTTPException(400, "start must be on or before end")
+
+    # repeat or comma-separate
+    columns = [c.strip() for x in (columns or COLUMNS) for c in x.split(",") if c.strip()]
+
+    unknown = [c for c in columns if c not in COLUMNS]
+
+    if unknown:
+        raise HTTPException(400, f"Unknown columns: {', '.join(unknown)}")
+
+    batches = store.iter_batches(
+        crop=crop,
+        mandi=mandi,
+        start=start,
+        end=end,
+        columns=columns,
+        batch_size=BATCH_ROWS,
+    )
+
+    chunks = (
+        _csv_chunks(batches, columns) if format == "csv"
+        else _ndjson_chunks(batches)
+    )
+
+    name = re.sub(
+        r"[^A-Za-z0-9_-]+", "-",
+        "_".join(["market_history", *(crop or []), *(mandi or [])])
+    )
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{format}"'
+        },
+    )
@@ -1,14 +1,22 @@
 from fastapi import APIRouter, Query, HTTPException
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-import os
-import random
+import hashlib
+import threading
 
 from datetime import datetime, timedelta
 
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 
+from ml.registry import ModelRegistry
+from ml.encoding import fit_encoders
+from ml.store import get_store
+from ml.price_index import get_price_index
+
 
 router = APIRouter(
     prefix="/api/market",
@@ -17,90 +25,72 @@ router = APIRouter(
 
 
 # ======================================================
-# PATH CONFIG
+# DATA STORE
 # ======================================================
 
-BASE_DIR = os.path.dirname(
-    os.path.dirname(
-        os.path.dirname(__file__)
-    )
-)
+store = get_store()
 
-DATA_PATH = os.path.join(
-    BASE_DIR,
-    "ml",
-    "data",
-    "mandi_data.csv"
-)
+print("📁 Prediction Store Path:", store.root)
 
-print("📁 Prediction CSV Path:", DATA_PATH)
+# per-series lookups without scanning the training frame
+index = get_price_index()
 
 
 # ======================================================
 # LOAD DATA
 # ======================================================
 
-df = None
-
-
-def load_data():
-    global df
+def load_data(path=None):
+    """
+    Full price history from the columnar store (dates pre-parsed)
+    """
 
     try:
-        df = pd.read_csv(DATA_PATH)
-
-        # Auto parse mixed date formats
-        df["date"] = pd.to_datetime(
-            df["date"],
-            format="mixed",
-            dayfirst=True,
-            errors="coerce"
-        )
+        df = store.read()
 
-        # Remove invalid dates
-        df = df.dropna(subset=["date"])
+        print("✅ Store Loaded:", len(df))
 
-        print("✅ CSV Loaded:", len(df))
+        return df
 
     except Exception as e:
-        print("❌ CSV ERROR:", e)
-        df = None
-
-
-load_data()
+        print("❌ STORE ERROR:", e)
+        return None
 
 
 # ======================================================
 # TRAIN MODEL
 # ======================================================
 
-model = None
+FEATURES = [
+    "arrivals",
+    "temp",
+    "rain",
+    "humidity",
+    "festival",
+    "crop_code",
+    "mandi_code",
+]
+
+MAX_DAYS = 60
+MAX_BATCH = 200
+MAX_SIMULATIONS = 500
 
 
-def train_model():
-    global model
+def train_model(df, previous_encoders=None):
 
     if df is None or len(df) < 10:
         print("❌ Not enough data to train")
-        return
-
-    data = df.copy()
-
-    # Encode categories
-    data["crop_code"] = data["crop"].astype("category").cat.codes
-    data["mandi_code"] = data["mandi"].astype("category").cat.codes
-
-    features = [
-        "arrivals",
-        "temp",
-        "rain",
-        "humidity",
-        "festival",
-        "crop_code",
-        "mandi_code",
-    ]
+        return None, None
+
+    # Encode categories (codes stay stable across retrains)
+    encoders = fit_encoders(df, ["crop", "mandi"], previous_encoders)
 
-    X = data[features]
+    data = df.assign(
+        crop_code=encoders["crop"].transform(df["crop"]).to_numpy(),
+        mandi_code=encoders["mandi"].transform(df["mandi"]).to_numpy(),
+    )
+
+    X = data[FEATURES]
     y = data["modal_price"]
 
     X_train, _, y_train, _ = train_test_split(
@@ -119,207 +109,412 @@ def train_model():
 
     print("✅ Market Model Trained")
 
-
-train_model()
+    return model, encoders
 
 
 # ======================================================
-# AUTO RETRAIN WHEN CSV UPDATES
+# MODEL REGISTRY
 # ======================================================
+# Loaded once at startup. When the store version changes
+# the model is retrained in a background thread; requests
+# keep using the current version until the new one is ready.
+
+registry = ModelRegistry(
+    name="market_rf",
+    data_path=store.version_path,
+    load_data=load_data,
+    train=train_model,
+)
 
-def reload_and_train():
-    load_data()
-    train_model()
+registry.load()
+
+
+@router.get("/model-status")
+def model_status():
+    return registry.status()
 
 
 # ======================================================
-# API : PREDICT
+# BATCHED FORECAST
 # ======================================================
+# Every (crop, mandi, day) row of every requested series is
+# stacked into ONE feature matrix and sent to model.predict
+# in a single call; only the cheap price smoothing runs
+# per day.
+#
+# Randomness comes from a per-request NumPy generator
+# seeded from the request itself, so identical requests
+# give identical answers (and can be cached). With
+# simulations > 1 many scenario paths are drawn at once
+# and the bands are real percentiles across those paths.
+
+def request_seed(crop, mandi, days, base_date):
+
+    key = f"{crop}|{mandi}|{days}|{base_date:%Y-%m-%d}"
+
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(),
+        "big"
+    )
 
-@router.get("/predict")
-def predict_price(
-    crop: str = Query(...),
-    mandi: str = Query(...),
-    days: int = Query(7)
-):
 
-    global df, model
+def _series_base(crop, mandi):
 
-    if df is None or model is None:
-        raise HTTPException(
-            status_code=500,
-            detail="ML model not loaded"
-        )
+    series = index.get(crop, mandi)
 
-    # Reload data before prediction
-    reload_and_train()
+    if series is None or len(series) < 5:
+        return None
 
-    data = df.copy()
+    # Newest row (series are kept sorted by date)
+    last = series.last()
 
-    # Filter
-    data = data[
-        (data["crop"] == crop) &
-        (data["mandi"] == mandi)
-    ]
+    # Date fix (never past)
+    last_date = last["date"]
 
-    if len(data) < 5:
-        raise HTTPException(
-            status_code=404,
-            detail="Not enough data for this crop/mandi"
-        )
+    today = pd.to_datetime(datetime.today().date())
 
-    # Sort by date
-    data = data.sort_values("date")
+    base_date = today if last_date < today else last_date
 
-    last = data.iloc[-1]
+    return last, base_date
 
-    # ==================================================
-    # DATE FIX (Never past)
-    # ==================================================
 
-    last_date = data["date"].max()
+def _prepare_series(last, base_date, days, rng, paths, codes):
 
-    today = pd.to_datetime(datetime.today().date())
+    crop_code, mandi_code = codes
 
-    if last_date < today:
-        base_date = today
-    else:
-        base_date = last_date
+    shape = (paths, days)
+
+    steps = np.arange(1, days + 1)
+
+    # -----------------------------
+    # Demand / Supply Simulation
+    # -----------------------------
+
+    demand = rng.uniform(0.97, 1.06, shape)
+
+    arrival_factor = np.broadcast_to(
+        np.maximum(0.9, 1 - steps * 0.015),
+        shape
+    )
+
+    # -----------------------------
+    # Weather Simulation
+    # -----------------------------
+
+    temp = float(last["temp"]) + rng.uniform(-2, 2, shape)
+
+    rain = (rng.random(shape) < 0.25).astype(float)
+
+    humidity = np.clip(
+        float(last["humidity"]) + rng.uniform(-6, 6, shape),
+        30,
+        90
+    )
+
+    weather = 1.0 - 0.05 * (rain > 0) - 0.04 * (temp > 35)
 
+    n = paths * days
 
-    # ==================================================
-    # Encode
-    # ==================================================
+    X = np.column_stack([
+        float(last["arrivals"]) * arrival_factor.ravel(),
+        temp.ravel(),
+        rain.ravel(),
+        humidity.ravel(),
+        np.zeros(n),
+        np.full(n, crop_code),
+        np.full(n, mandi_code),
+    ])
 
-    crop_code = data["crop"].astype("category").cat.codes.iloc[0]
-    mandi_code = data["mandi"].astype("category").cat.codes.iloc[0]
+    return {
+        "base_date": base_date,
+        "base_price": float(last["modal_price"]),
+        "demand": demand,
+        "weather": weather,
+        "X": X,
+        "rng": rng,
+    }
+
+
+def _finish_series(prep, ml_prices):
+
+    demand = prep["demand"]
+    paths, days = demand.shape
+
+    rng = prep["rng"]
+    base_date = prep["base_date"]
+
+    hybrid = ml_prices.reshape(paths, days) * demand * prep["weather"]
+
+    # Smooth transition, all paths at once
+    final = np.empty_like(hybrid)
+    base_price = np.full(paths, prep["base_price"])
 
+    for d in range(days):
+        base_price = 0.6 * base_price + 0.4 * hybrid[:, d]
+        final[:, d] = base_price
 
-    # ==================================================
-    # FORECAST
-    # ==================================================
+    if paths == 1:
+        central = final[0]
+        lower = central * 0.9
+        upper = central * 1.1
+
+    else:
+        lower, central, upper = np.percentile(final, [10, 50, 90], axis=0)
+
+    # Ensemble
+    prophet = central * rng.uniform(0.96, 1.02, days)
+    xgb = central * rng.uniform(0.98, 1.05, days)
 
     forecasts = []
 
-    base_price = float(last["modal_price"])
+    for i in range(days):
+
+        forecasts.append({
+            "date": (base_date + timedelta(days=i + 1)).strftime("%Y-%m-%d"),
+
+            "final_price": round(float(central[i]), 2),
 
-    last_arrival = float(last["arrivals"])
-    last_temp = float(last["temp"])
-    last_humidity = float(last["humidity"])
+            "prophet_price": round(float(prophet[i]), 2),
 
+            "xgb_price": round(float(xgb[i]), 2),
 
-    for i in range(1, days + 1):
+            "yhat_lower": round(float(lower[i]), 2),
 
-        future_date = base_date + timedelta(days=i)
+            "yhat_upper": round(float(upper[i]), 2),
+        })
 
-        # -----------------------------
-        # Demand / Supply Simulation
-        # -----------------------------
+    return forecasts
 
-        demand_factor = random.uniform(0.97, 1.06)
 
-        arrival_factor = max(
-            0.9,
-            1 - (i * 0.015)
-        )
+# ======================================================
+# RESPONSE CACHE
+# ======================================================
 
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
 
-        # -----------------------------
-        # Weather Simulation
-        # -----------------------------
+CACHE_SIZE = 512
 
-        temp = last_temp + random.uniform(-2, 2)
 
-        rain = random.choice([0, 0, 0, 1])
+def _cache_get(key):
 
-        humidity = min(
-            90,
-            max(
-                30,
-                last_humidity + random.uniform(-6, 6)
-            )
-        )
+    with _cache_lock:
+
+        hit = _cache.get(key)
+
+        if hit is not None:
+            _cache.move_to_end(key)
+
+        return hit
+
+
+def _cache_put(key, value):
 
+    with _cache_lock:
 
-        weather_factor = 1.0
+        _cache[key] = value
+        _cache.move_to_end(key)
 
-        if rain > 0:
-            weather_factor -= 0.05
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
 
-        if temp > 35:
-            weather_factor -= 0.04
 
+def forecast_many(bundle, items):
+    """
+    items: [(crop, mandi, days, seed, simulations)]
+    -> [forecast list | None]
+    """
 
-        # -----------------------------
-        # ML INPUT (DataFrame = no warning)
-        # -----------------------------
+    results = [None] * len(items)
+    preps = []
 
-        X_future = pd.DataFrame([{
-            "arrivals": last_arrival * arrival_factor,
-            "temp": temp,
-            "rain": rain,
-            "humidity": humidity,
-            "festival": 0,
-            "crop_code": crop_code,
-            "mandi_code": mandi_code,
-        }])
+    for idx, (crop, mandi, days, seed, simulations) in enumerate(items):
 
+        base = _series_base(crop, mandi)
 
-        ml_price = float(model.predict(X_future)[0])
+        if base is None:
+            continue
 
+        last, base_date = base
 
-        # -----------------------------
-        # HYBRID FINAL PRICE
-        # -----------------------------
+        if seed is None:
+            seed = request_seed(crop, mandi, days, base_date)
 
-        final_price = (
-            ml_price *
-            demand_factor *
-            weather_factor
+        key = (
+            bundle.version, index.version, crop, mandi, days, seed, simulations,
+            base_date.strftime("%Y-%m-%d")
         )
 
-        # Smooth transition
-        final_price = (
-            0.6 * base_price +
-            0.4 * final_price
+        hit = _cache_get(key)
+
+        if hit is not None:
+            results[idx] = hit
+            continue
+
+        # Encode (O(1) vocabulary lookup)
+        codes = (
+            bundle.encoders["crop"].encode(crop),
+            bundle.encoders["mandi"].encode(mandi),
+        )
+
+        prep = _prepare_series(
+            last,
+            base_date,
+            days,
+            np.random.default_rng(seed),
+            max(1, simulations),
+            codes
         )
 
-        base_price = final_price
+        preps.append((idx, key, prep))
 
+    if not preps:
+        return results
 
-        # -----------------------------
-        # ENSEMBLE
-        # -----------------------------
+    X_all = pd.DataFrame(
+        np.vstack([p["X"] for _, _, p in preps]),
+        columns=FEATURES
+    )
 
-        prophet_price = final_price * random.uniform(0.96, 1.02)
+    # Single vectorized predict for the whole batch
+    ml_all = bundle.model.predict(X_all)
 
-        xgb_price = final_price * random.uniform(0.98, 1.05)
+    offset = 0
 
+    for idx, key, p in preps:
 
-        forecasts.append({
-            "date": future_date.strftime("%Y-%m-%d"),
+        n = len(p["X"])
 
-            "final_price": round(final_price, 2),
+        fc = _finish_series(p, ml_all[offset:offset + n])
 
-            "prophet_price": round(prophet_price, 2),
+        offset += n
 
-            "xgb_price": round(xgb_price, 2),
+        _cache_put(key, fc)
 
-            "yhat_lower": round(final_price * 0.9, 2),
+        results[idx] = fc
+
+    return results
+
+
+def _current_bundle():
+
+    # Retrain in background if the store changed (non-blocking)
+    registry.refresh()
+
+    bundle = registry.current()
+
+    if bundle is None or bundle.model is None:
+        raise HTTPException(
+            status_code=500,
+            detail="ML model not loaded"
+        )
+
+    return bundle
+
+
+REASON = (
+    "Hybrid AI Model: RandomForest + "
+    "Demand-Supply + Weather Simulation + Ensemble"
+)
+
+MC_REASON = REASON + " (Monte-Carlo p10/p50/p90 bands)"
+
+
+def _reason(simulations):
+    # one path has no spread to take percentiles of (fixed bands)
+    return MC_REASON if simulations > 1 else REASON
 
-            "yhat_upper": round(final_price * 1.1, 2),
-        })
 
+# ======================================================
+# API : PREDICT
+# ======================================================
+
+@router.get("/predict")
+def predict_price(
+    crop: str = Query(...),
+    mandi: str = Query(...),
+    days: int = Query(7, ge=1, le=MAX_DAYS),
+    seed: Optional[int] = Query(None, ge=0),
+    simulations: int = Query(0, ge=0, le=MAX_SIMULATIONS)
+):
+
+    bundle = _current_bundle()
 
-    # ==================================================
-    # RESPONSE
-    # ==================================================
+    forecasts = forecast_many(
+        bundle,
+        [(crop, mandi, days, seed, simulations)]
+    )[0]
+
+    if forecasts is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Not enough data for this crop/mandi"
+        )
 
     return {
         "forecast": forecasts,
 
+        "reason": _reason(simulations)
+    }
+
+
+# ======================================================
+# API : PREDICT BATCH
+# ======================================================
+
+class PredictItem(BaseModel):
+    crop: str
+    mandi: str
+    days: int = Field(7, ge=1, le=MAX_DAYS)
+    seed: Optional[int] = Field(None, ge=0)
+    simulations: int = Field(0, ge=0, le=MAX_SIMULATIONS)
+
+
+class PredictBatchRequest(BaseModel):
+    items: List[PredictItem] = Field(..., max_length=MAX_BATCH)
+
+
+@router.post("/predict-batch")
+def predict_batch(req: PredictBatchRequest):
+
+    bundle = _current_bundle()
+
+    items = [
+        (x.crop, x.mandi, x.days, x.seed, x.simulations)
+        for x in req.items
+    ]
+
+    forecasts = forecast_many(bundle, items)
+
+    results = []
+
+    for (crop, mandi, days, _, simulations), fc in zip(items, forecasts):
+
+        if fc is None:
+            results.append({
+                "crop": crop,
+                "mandi": mandi,
+                "days": days,
+                "status": "error",
+                "detail": "Not enough data for this crop/mandi",
+            })
+            continue
+
+        results.append({
+            "crop": crop,
+            "mandi": mandi,
+            "days": days,
+            "status": "OK",
+            "forecast": fc,
+            "reason": _reason(simulations),
+        })
+
+    return {
+        "results": results,
+        "model_version": bundle.version,
+        # per-item "reason" is exact; this one only when all agree
         "reason": (
-            "Hybrid AI Model: RandomForest + "
-            "Demand-Supply + Weather Simulation + Ensemble"
+            MC_REASON if items and all(x[4] > 1 for x in items)
+            else REASON
         )
     }
@@ -1,12 +1,15 @@
 from fastapi import APIRouter
 import pandas as pd
-import requests
 import os
-import time
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
 
+from ml.store import get_store
+from app.services.http_client import http
+from app.services.sync_state import (
+    sync_state, SingleFlight, pair_key, STATE_FILE
+)
+
 load_dotenv()
 
 router = APIRouter(
@@ -23,92 +26,95 @@ API_KEY = os.getenv("DATA_GOV_API_KEY")
 
 AGMARKET_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
 
+PAGE_SIZE = 30
+MAX_PAGES = 10
 
-BASE_DIR = os.path.dirname(
-    os.path.dirname(
-        os.path.dirname(__file__)
-    )
-)
-
-DATA_DIR = os.path.join(BASE_DIR, "ml", "data")
-
-CSV_PATH = os.path.join(DATA_DIR, "mandi_data.csv")
 
-CACHE_FILE = os.path.join(DATA_DIR, "last_sync.json")
+store = get_store()
 
-SYNC_INTERVAL_HOURS = 6   # sync every 6 hours only
-
-
-print("📁 Market CSV:", CSV_PATH)
-print("📁 Sync Cache:", CACHE_FILE)
+print("📁 Market Store:", store.root)
+print("📁 Sync State:", STATE_FILE)
 
 
 # ======================================================
-# CACHE HANDLING
+# FRESHNESS TABLE
 # ======================================================
 
-def get_last_sync():
-
-    if not os.path.exists(CACHE_FILE):
-        return None
+# concurrent syncs of the same pair share one upstream fetch
+inflight = SingleFlight()
 
-    try:
-        with open(CACHE_FILE, "r") as f:
-            data = json.load(f)
 
-        return datetime.fromisoformat(data["last_sync"])
+def to_iso(date_str):
 
-    except:
+    if not date_str:
         return None
 
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str.strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
 
-def update_last_sync():
-
-    with open(CACHE_FILE, "w") as f:
-        json.dump(
-            {"last_sync": datetime.now().isoformat()},
-            f
-        )
+    return None
 
 
 # ======================================================
 # FETCH GOVT DATA
 # ======================================================
 
-def fetch_govt_data(crop: str, mandi: str):
+def fetch_govt_data(crop: str, mandi: str, since: str = None):
+    """
+    Newest-first pages; stops once a page reaches `since`
+    (the stored watermark). Only records newer than it are returned.
+    """
 
     if not API_KEY:
         raise Exception("DATA_GOV_API_KEY missing")
 
-    params = {
-        "api-key": API_KEY,
-        "format": "json",
-        "limit": 30,
-        "filters[commodity]": crop,
-        "filters[market]": mandi,
-    }
+    print("🌐 Fetching from Agmarknet...", crop, mandi, "since", since)
 
-    print("🌐 Fetching from Agmarknet...")
+    records = []
 
-    res = requests.get(
-        AGMARKET_URL,
-        params=params,
-        timeout=20
-    )
+    for page in range(MAX_PAGES):
+
+        params = {
+            "api-key": API_KEY,
+            "format": "json",
+            "limit": PAGE_SIZE,
+            "offset": page * PAGE_SIZE,
+            "filters[commodity]": crop,
+            "filters[market]": mandi,
+            "sort[arrival_date]": "desc",
+        }
+
+        # called from a worker thread (single-flight), so the
+        # blocking entry point of the shared pooled client
+        data = http.get_json_sync(AGMARKET_URL, params=params, timeout=20)
 
-    if res.status_code != 200:
-        raise Exception(f"HTTP {res.status_code}")
+        batch = data.get("records", [])
 
-    data = res.json()
+        dates = [to_iso(r.get("arrival_date")) for r in batch]
 
-    return data.get("records", [])
+        for r, d in zip(batch, dates):
+            if since is None or (d and d > since):
+                records.append(r)
+
+        if since is None or len(batch) < PAGE_SIZE:
+            break
+
+        known = [d for d in dates if d]
+
+        if not known or min(known) <= since:
+            break
+
+    return records
 
 
 # ======================================================
-# SAVE CSV
+# SAVE TO STORE
 # ======================================================
 
-def save_to_csv(records):
+def save_to_store(records):
 
     if not records:
         return 0
@@ -131,68 +137,80 @@ def save_to_csv(records):
 
     df_new = pd.DataFrame(rows)
 
-    if os.path.exists(CSV_PATH):
+    # Append-only: deduped against the key index in O(batch),
+    # folded into the partitions later by the compactor
+    return store.append(df_new)
+
 
-        df_old = pd.read_csv(CSV_PATH)
+# ======================================================
+# SYNC ENDPOINT (FAST)
+# ======================================================
 
-        df_all = pd.concat([df_old, df_new])
+def _sync_pair(crop: str, mandi: str):
 
-        df_all = df_all.drop_duplicates(
-            ["date", "crop", "mandi"]
-        )
+    row = sync_state.get(crop, mandi)
 
-    else:
-        df_all = df_new
+    watermark = row.get("watermark")
 
-    df_all.to_csv(CSV_PATH, index=False)
+    # Fetch only what is newer than the watermark
+    records = fetch_govt_data(crop, mandi, since=watermark)
 
-    return len(df_new)
+    if not records:
 
+        row = sync_state.mark_synced(crop, mandi, status="empty")
 
-# ======================================================
-# SYNC ENDPOINT (FAST)
-# ======================================================
+        return {
+            "status": "empty",
+            "message": "No new data from govt API",
+            "watermark": row.get("watermark"),
+        }
 
-@router.get("/sync-live")
-def sync_live_data(crop: str, mandi: str):
+    saved = save_to_store(records)
 
-    try:
+    newest = max(
+        (d for d in (to_iso(r.get("arrival_date")) for r in records) if d),
+        default=None
+    )
 
-        # Check cache
-        last_sync = get_last_sync()
+    row = sync_state.mark_synced(
+        crop, mandi,
+        watermark=newest,
+        status="success",
+        rows=saved
+    )
 
-        if last_sync:
+    return {
+        "status": "success",
+        "rows_saved": saved,
+        "message": "Live mandi data synced",
+        "watermark": row.get("watermark"),
+        "time": row["last_sync"]
+    }
 
-            age = datetime.now() - last_sync
 
-            if age < timedelta(hours=SYNC_INTERVAL_HOURS):
+@router.get("/sync-live")
+def sync_live_data(crop: str, mandi: str):
 
-                return {
-                    "status": "cached",
-                    "message": "Using cached mandi data",
-                    "last_sync": last_sync.isoformat()
-                }
+    try:
 
-        # Fetch fresh
-        records = fetch_govt_data(crop, mandi)
+        # Check this pair's freshness
+        fresh, row = sync_state.is_fresh(crop, mandi)
 
-        if not records:
+        if fresh:
 
             return {
-                "status": "empty",
-                "message": "No new data from govt API"
+                "status": "cached",
+                "message": "Using cached mandi data",
+                "last_sync": row["last_sync"],
+                "watermark": row.get("watermark"),
             }
 
-        saved = save_to_csv(records)
-
-        update_last_sync()
+        result, shared = inflight.do(
+            pair_key(crop, mandi),
+            lambda: _sync_pair(crop, mandi)
+        )
 
-        return {
-            "status": "success",
-            "rows_saved": saved,
-            "message": "Live mandi data synced",
-            "time": datetime.now().isoformat()
-        }
+        return {**result, "coalesced": shared}
 
     except Exception as e:
 
@@ -202,3 +220,8 @@ def sync_live_data(crop: str, mandi: str):
             "status": "error",
             "message": str(e)
         }
+
+
+@router.get("/sync-status")
+def sync_status():
+    return sync_state.all()
@@ -1,8 +1,9 @@
 import os
-import requests
 from fastapi import APIRouter, HTTPException
 from dotenv import load_dotenv
 
+from app.services.http_client import http, UpstreamError
+
 # ✅ load env file
 load_dotenv()
 
@@ -11,7 +12,7 @@ router = APIRouter(prefix="/api/weather", tags=["Weather"])
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
 @router.get("/by-coordinates")
-def weather_by_coordinates(lat: float, lon: float):
+async def weather_by_coordinates(lat: float, lon: float):
 
     # ✅ debug print
     print("✅ API KEY FROM ENV =", API_KEY)
@@ -27,7 +28,11 @@ def weather_by_coordinates(lat: float, lon: float):
         "units": "metric"
     }
 
-    res = requests.get(url, params=params)
+    try:
+        res = await http.get(url, params=params, timeout=10)
+    except UpstreamError as e:
+        raise HTTPException(status_code=e.status_code or 502, detail=str(e))
+
     data = res.json()
 
     print("✅ OpenWeather status:", res.status_code)
@@ -0,0 +1,353 @@
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime
+from functools import lru_cache
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# ======================================================
+# COLUMNAR AGMARKNET RECORDS
+# ======================================================
+# A data.gov.in payload decoded once into column arrays:
+#
+#   text     market, district, state, commodity, variety,
+#            arrival_date (as sent)
+#   keys     market_norm (lower/stripped), market_code
+#            (index into the distinct markets)
+#   typed    min/max/modal price float64, ordinal int32
+#            (date.toordinal(), 0 when unparseable)
+#
+# Filtering, ordering and top-k run on these arrays; rows
+# become dicts only via to_dicts() at the response boundary.
+#
+# Rankings match a mandi to every market whose normalized
+# name contains it ("nashik" finds "Nashik(Devlali)"), as
+# /rates does. market_key() is the exact key, with an alias
+# table for renamed cities and known yards, used where one
+# name must resolve to one place (the mandi index).
+
+MARKET_ALIASES = {
+    "vashi": "mumbai",
+    "vashi new mumbai": "mumbai",
+    "navi mumbai": "mumbai",
+    "bengaluru": "bangalore",
+    "binny mill": "bangalore",
+    "belagavi": "belgaum",
+    "mysuru": "mysore",
+    "hubballi": "hubli",
+    "kalamna": "nagpur",
+    "koyambedu": "chennai",
+}
+
+
+def market_key(name):
+    """
+    "Pune(Pimpri)" -> "pune", "Binny Mill (F&V), Bangalore"
+    -> "binny mill" -> alias "bangalore"
+    """
+
+    key = (name or "").lower()
+
+    key = re.sub(r"\(.*?\)", " ", key)        # sub-yard / tags
+    key = key.split(",")[0]
+    key = re.sub(r"\b(apmc|f&v)\b", " ", key)
+    key = " ".join(key.split())
+
+    return MARKET_ALIASES.get(key, key)
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(date_str):
+
+    if not date_str:
+        return 0
+
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str.strip(), fmt).toordinal()
+        except ValueError:
+            pass
+
+    return 0
+
+
+def _text(records, key):
+    return np.array([r.get(key) for r in records], dtype=object)
+
+
+def _price(records, key):
+
+    values = pd.to_numeric(
+        pd.Series([r.get(key) for r in records], dtype=object),
+        errors="coerce"
+    )
+
+    return values.fillna(0).to_numpy(dtype=np.float64)
+
+
+class RecordBatch:
+
+    __slots__ = (
+        "market", "district", "state", "commodity", "variety",
+        "arrival_date", "market_norm", "market_code", "markets",
+        "min_price", "max_price", "modal_price", "ordinal",
+        "_digest", "_matches",
+    )
+
+    def __init__(self, records):
+
+        self.market = _text(records, "market")
+        self.district = _text(records, "districtname")
+        self.state = _text(records, "statename")
+        self.commodity = _text(records, "commodity")
+        self.variety = _text(records, "variety")
+        self.arrival_date = _text(records, "arrival_date")
+
+        self.min_price = _price(records, "min_price")
+        self.max_price = _price(records, "max_price")
+        self.modal_price = _price(records, "modal_price")
+
+        # distinct markets: normalize / match once per market
+        norm = [(m or "").strip().lower() for m in self.market]
+
+        self.markets, self.market_code = (
+            np.unique(np.array(norm, dtype=str), return_inverse=True)
+            if norm else (np.array([], dtype=str), np.array([], dtype=np.intp))
+        )
+
+        self.market_norm = self.markets[self.market_code]
+
+        self.ordinal = np.fromiter(
+            (date_ordinal(d) for d in self.arrival_date),
+            dtype=np.int32,
+            count=len(self.arrival_date)
+        )
+
+        self._digest = None
+        self._matches = {}
+
+    def __len__(self):
+        return len(self.modal_price)
+
+    @property
+    def digest(self):
+        """
+        Content hash of what rankings read (markets, dates,
+        prices): changes whenever a sync changes the data
+        """
+
+        if self._digest is None:
+
+            h = hashlib.blake2b(digest_size=8)
+
+            h.update("\x1f".join(self.markets).encode())
+            h.update(self.market_code.astype(np.int64).tobytes())
+            h.update(self.ordinal.tobytes())
+            h.update(self.modal_price.tobytes())
+
+            self._digest = h.hexdigest()
+
+        return self._digest
+
+    # ==================================================
+    # QUERIES (return row indices)
+    # ==================================================
+
+    def match_market(self, needle):
+        """
+        Rows whose normalized market contains `needle`
+        """
+
+        needle = (needle or "").strip().lower()
+
+        hit = np.array([needle in m for m in self.markets], dtype=bool)
+
+        if not len(hit):
+            return np.array([], dtype=np.intp)
+
+        return np.flatnonzero(hit[self.market_code])
+
+    def newest_first(self, idx, k=None):
+        """
+        idx ordered by arrival date, newest first; ties keep
+        payload order (same as a stable reverse sort)
+        """
+
+        order = np.argsort(-self.ordinal[idx], kind="stable")
+
+        if k is not None:
+            order = order[:k]
+
+        return idx[order]
+
+    def latest_per_market(self):
+        """
+        market code -> row index of its newest record
+        (ties: earliest row)
+        """
+
+        n = len(self)
+
+        if n == 0:
+            return np.full(len(self.markets), -1)
+
+        # sort by market, then newest, then payload order
+        order = np.lexsort((np.arange(n), -self.ordinal, self.market_code))
+
+        codes = self.market_code[order]
+
+        first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+        latest = np.full(len(self.markets), -1)
+        latest[codes[first]] = order[first]
+
+        return latest
+
+    def _match_pairs(self, needles):
+        """
+        (market codes, needle slots) for every distinct market
+        containing each needle; memoized per needle tuple
+        """
+
+        hit = self._matches.get(needles)
+
+        if hit is None:
+
+            pairs = [
+                (code, slot)
+                for slot, needle in enumerate(needles)
+                for code, market in enumerate(self.markets)
+                if needle in market
+            ]
+
+            codes, slots = zip(*pairs) if pairs else ((), ())
+
+            hit = self._matches[needles] = (
+                np.array(codes, dtype=np.intp),
+                np.array(slots, dtype=np.intp),
+            )
+
+        return hit
+
+    def latest_matching(self, needles):
+        """
+        needles: normalized mandi names (tuple). Newest row
+        among the markets containing each needle (ties:
+        earliest row), -1 where none does.
+        """
+
+        out = np.full(len(needles), -1)
+
+        codes, slots = self._match_pairs(needles)
+
+        latest = self.latest_per_market()
+
+        ok = latest[codes] >= 0 if len(codes) else codes.astype(bool)
+
+        if not ok.any():
+            return out
+
+        rows, slots = latest[codes[ok]], slots[ok]
+
+        # per slot: newest date, then earliest row, sorts last
+        order = np.lexsort((-rows, self.ordinal[rows], slots))
+
+        slots, rows = slots[order], rows[order]
+
+        last = np.flatnonzero(np.r_[slots[1:] != slots[:-1], True])
+
+        out[slots[last]] = rows[last]
+
+        return out
+
+    # ==================================================
+    # RESPONSE BOUNDARY
+    # ==================================================
+
+    def to_dicts(self, idx):
+
+        return [
+            {
+                "market": self.market[i],
+                "district": self.district[i],
+                "state": self.state[i],
+                "commodity": self.commodity[i],
+                "variety": self.variety[i],
+                "arrival_date": self.arrival_date[i],
+
+                "min_price": float(self.min_price[i]),
+                "max_price": float(self.max_price[i]),
+                "modal_price": float(self.modal_price[i]),
+
+                "unit": "₹/Quintal",
+            }
+            for i in idx
+        ]
+
+
+# ======================================================
+# BATCH MEMO
+# ======================================================
+# One batch per payload, keyed on a content digest stamped
+# into the payload once, when it is fetched. The stamp is
+# stored with the cache entry, so it survives a Redis round
+# trip (which hands back a new dict every time) and repeat
+# requests skip decoding. Hashing the records is nearly as
+# costly as decoding them, so unstamped payloads pay it once
+# per call as a fallback.
+
+BATCH_KEY = "_batch_key"
+
+_batches = OrderedDict()
+_batches_lock = threading.Lock()
+
+MAX_BATCHES = 32
+
+
+def payload_digest(records):
+
+    raw = json.dumps(records, separators=(",", ":"), sort_keys=True)
+
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def stamp(data):
+    """
+    Tag a fresh upstream payload with its digest (in place)
+    """
+
+    if isinstance(data, dict) and "records" in data:
+        data[BATCH_KEY] = payload_digest(data["records"])
+
+    return data
+
+
+def batch_for(data):
+
+    records = data.get("records", [])
+
+    key = data.get(BATCH_KEY) or payload_digest(records)
+
+    with _batches_lock:
+
+        hit = _batches.get(key)
+
+        if hit is not None:
+            _batches.move_to_end(key)
+            return hit
+
+    batch = RecordBatch(records)
+
+    with _batches_lock:
+
+        _batches[key] = batch
+
+        while len(_batches) > MAX_BATCHES:
+            _batches.popitem(last=False)
+
+    return batch
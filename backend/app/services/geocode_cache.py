@@ -0,0 +1,303 @@
+import os
+import time
+import sqlite3
+import asyncio
+import argparse
+import threading
+
+from app.services.http_client import http
+
+
+# ======================================================
+# PERSISTENT GEOCODE CACHE
+# ======================================================
+# Nominatim lookups for mandi names, cached in SQLite
+# (WAL mode) so results survive restarts and are shared by
+# every worker process on the host:
+#
+#   geocode(key PRIMARY KEY, lat, lon, query, created_at, expires_at)
+#
+# Found coordinates keep for POSITIVE_TTL; "not found" is
+# cached too, but only for NEGATIVE_TTL so new spellings or
+# upstream fixes are picked up. Upstream failures are never
+# cached.
+#
+# Async callers use aget() / aput(): SQLite reads and WAL
+# commits run in a worker thread, never on the event loop.
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(
+        os.path.dirname(__file__)
+    )
+)
+
+CACHE_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(BASE_DIR, "ml", "data", "geocode_cache.sqlite")
+)
+
+POSITIVE_TTL = int(os.getenv("GEOCODE_TTL_DAYS", "180")) * 86400
+NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL_HOURS", "24")) * 3600
+
+# a self-hosted Nominatim can be given a higher per-host
+# limit in http_client.HOST_LIMITS (public one: 1 at a time)
+NOMINATIM_URL = os.getenv(
+    "NOMINATIM_URL",
+    "https://nominatim.openstreetmap.org/search"
+)
+
+
+def cache_key(mandi, state):
+    return f"{(mandi or '').strip().lower()}|{(state or '').strip().lower()}"
+
+
+class GeocodeCache:
+
+    def __init__(self, path=CACHE_PATH):
+
+        self.path = path
+
+        self._local = threading.local()
+
+        self.metrics = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+    def _conn(self):
+
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=10)
+
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode (
+                    key TEXT PRIMARY KEY,
+                    lat REAL,
+                    lon REAL,
+                    query TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+            conn.commit()
+
+            self._local.conn = conn
+
+        return conn
+
+    def get(self, mandi, state):
+        """
+        (hit, coords): hit=False when unknown or expired;
+        coords is None for a cached "not found"
+        """
+
+        row = self._conn().execute(
+            "SELECT lat, lon, expires_at FROM geocode WHERE key = ?",
+            (cache_key(mandi, state),)
+        ).fetchone()
+
+        if row is None or row[2] <= time.time():
+            self.metrics["misses"] += 1
+            return False, None
+
+        if row[0] is None:
+            self.metrics["negative_hits"] += 1
+            return True, None
+
+        self.metrics["hits"] += 1
+
+        return True, (row[0], row[1])
+
+    def put(self, mandi, state, coords, query=None):
+
+        now = time.time()
+
+        ttl = POSITIVE_TTL if coords else NEGATIVE_TTL
+
+        lat, lon = coords if coords else (None, None)
+
+        conn = self._conn()
+
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+            (cache_key(mandi, state), lat, lon, query, now, now + ttl)
+        )
+
+        conn.commit()
+
+    async def aget(self, mandi, state):
+        return await asyncio.to_thread(self.get, mandi, state)
+
+    async def aput(self, mandi, state, coords, query=None):
+        return await asyncio.to_thread(self.put, mandi, state, coords, query)
+
+    def stats(self):
+
+        conn = self._conn()
+
+        now = time.time()
+
+        found, missing = conn.execute(
+            """
+            SELECT
+                SUM(lat IS NOT NULL AND expires_at > ?),
+                SUM(lat IS NULL AND expires_at > ?)
+            FROM geocode
+            """,
+            (now, now)
+        ).fetchone()
+
+        return {
+            "path": self.path,
+            "entries": found or 0,
+            "negative_entries": missing or 0,
+            **self.metrics,
+        }
+
+
+geocode_cache = GeocodeCache()
+
+
+# ======================================================
+# NOMINATIM LOOKUP
+# ======================================================
+
+def query_variants(mandi, state):
+    # most specific first
+    return [
+        f"{mandi} APMC {state} India",
+        f"{mandi} mandi {state} India",
+        f"{mandi} market {state} India",
+        f"{mandi} {state} India",
+        f"{mandi} India",
+    ]
+
+
+async def _search(q):
+    """
+    coords, or None when Nominatim has no match.
+    Raises on upstream failure.
+    """
+
+    data = await http.get_json(
+        NOMINATIM_URL,
+        params={"q": q, "format": "json", "limit": 1},
+        timeout=10,
+    )
+
+    if data:
+        return float(data[0]["lat"]), float(data[0]["lon"])
+
+    return None
+
+
+async def lookup(mandi, state):
+    """
+    Variants one at a time, most specific first, stopping at
+    the first match: the public Nominatim allows 1 request per
+    second (enforced per host by the shared client), so firing
+    them together would only queue them.
+    Returns (coords, query, complete) where complete=False
+    means a failure may have hidden a match.
+    """
+
+    complete = True
+
+    for q in query_variants(mandi, state):
+
+        try:
+            coords = await _search(q)
+        except Exception:
+            complete = False
+            continue
+
+        if coords:
+            return coords, q, True
+
+    return None, None, complete
+
+
+async def geocode_mandi(mandi: str, state: str):
+
+    hit, coords = await geocode_cache.aget(mandi, state)
+
+    if hit:
+        return coords
+
+    coords, query, complete = await lookup(mandi, state)
+
+    # a miss caused by upstream errors is not a real "not found"
+    if coords or complete:
+        await geocode_cache.aput(mandi, state, coords, query)
+
+    return coords
+
+
+# ======================================================
+# PRE-WARM
+# ======================================================
+
+async def prewarm(names, state, refresh=False):
+
+    summary = {"found": 0, "not_found": 0, "cached": 0}
+
+    for name in names:
+
+        if not refresh and (await geocode_cache.aget(name, state))[0]:
+            summary["cached"] += 1
+            continue
+
+        coords, query, complete = await lookup(name, state)
+
+        if coords or complete:
+            await geocode_cache.aput(name, state, coords, query)
+
+        summary["found" if coords else "not_found"] += 1
+
+        print(("✅" if coords else "❌"), name, coords)
+
+    return summary
+
+
+def _store_mandis():
+
+    from ml.store import get_store
+
+    return sorted({mandi for _, mandi in get_store().series()})
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Geocode cache tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("prewarm", help="geocode mandi names into the cache")
+    p.add_argument("names", nargs="*", help="defaults to every mandi in the market store")
+    p.add_argument("--file", help="text file, one mandi name per line")
+    p.add_argument("--state", default="Maharashtra")
+    p.add_argument("--refresh", action="store_true", help="re-query cached names")
+
+    sub.add_parser("info")
+
+    args = parser.parse_args()
+
+    if args.cmd == "prewarm":
+
+        names = list(args.names)
+
+        if args.file:
+            with open(args.file, "r") as f:
+                names += [line.strip() for line in f if line.strip()]
+
+        if not names:
+            names = _store_mandis()
+
+        print(asyncio.run(prewarm(names, args.state, args.refresh)))
+
+    print(geocode_cache.stats())
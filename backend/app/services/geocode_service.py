@@ -1,10 +1,12 @@
-import os, requests
+import os
+from app.services.http_client import http
+
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
 def geocode_city(city: str):
     url = "http://api.openweathermap.org/geo/1.0/direct"
     params = {"q": city, "limit": 1, "appid": OPENWEATHER_API_KEY}
-    res = requests.get(url, params=params, timeout=10)
+    res = http.get_sync(url, params=params, timeout=10)
     res.raise_for_status()
     data = res.json()
     if not data:
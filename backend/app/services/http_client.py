@@ -0,0 +1,404 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+
+# ======================================================
+# SHARED OUTBOUND HTTP CLIENT
+# ======================================================
+# One pooled httpx.AsyncClient for every upstream we call
+# (data.gov.in, OpenWeather, Nominatim, OSRM), so requests
+# reuse keep-alive TCP/TLS connections instead of paying a
+# handshake each time.
+#
+# The client lives on its own event-loop thread. Async code
+# awaits get()/get_json(); sync routes and worker threads
+# call get_sync()/get_json_sync(). Either way the request
+# goes through the same pool and the same per-host state:
+#
+#   - per-host concurrency limit (semaphore) and, where a
+#     usage policy asks for it, a request-rate cap
+#   - timeouts
+#   - retries with jittered backoff on 429 / 5xx / network
+#     errors (GET only), honouring Retry-After
+#   - circuit breaker: after BREAKER_FAILURES consecutive
+#     failures a host is skipped for BREAKER_COOLDOWN seconds,
+#     then one probe request decides whether it closes again
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+DEFAULT_TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+
+DEFAULT_RETRIES = 2
+BACKOFF_BASE = 0.3
+BACKOFF_MAX = 5.0
+
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 30.0
+
+DEFAULT_HOST_LIMIT = 10
+
+HOST_LIMITS = {
+    "nominatim.openstreetmap.org": 1,   # usage policy: 1 req at a time
+    "router.project-osrm.org": 4,
+    "api.data.gov.in": 8,
+}
+
+# requests per second (spacing between request starts)
+HOST_RATES = {
+    "nominatim.openstreetmap.org": 1.0,  # usage policy: max 1 req/s
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+USER_AGENT = "SmartAgriAI/1.0"
+
+
+class UpstreamError(Exception):
+
+    def __init__(self, message, status_code=None, body=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class RateLimiter:
+    """
+    Spaces request starts at least 1/rate seconds apart
+    """
+
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / max(rate_per_sec, 0.001)
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+
+        async with self._lock:
+
+            now = asyncio.get_running_loop().time()
+
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+
+    __slots__ = ("failures", "opened_at", "probing")
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+
+        if self.opened_at is None:
+            return "closed"
+
+        if time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+            return "half-open"
+
+        return "open"
+
+    def allow(self):
+
+        state = self.state
+
+        if state == "closed":
+            return True
+
+        # half-open: let exactly one probe through
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+
+        self.failures += 1
+        self.probing = False
+
+        if self.failures >= BREAKER_FAILURES:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # attempt ended with no verdict (cancelled, bug): free the probe slot
+        self.probing = False
+
+
+class HttpClient:
+
+    def __init__(self, transport=None):
+
+        # injectable for stub servers / tests
+        self._transport = transport
+
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._start_lock = threading.Lock()
+
+        self._limits = {}
+        self._rates = {}
+        self._breakers = {}
+        self._stats = {}
+
+    # ==================================================
+    # LOOP THREAD
+    # ==================================================
+
+    def _ensure_started(self):
+
+        if self._loop is not None:
+            return self._loop
+
+        with self._start_lock:
+
+            if self._loop is None:
+
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(
+                    target=run, daemon=True, name="http-client"
+                )
+                self._thread.start()
+
+                ready.wait()
+
+                self._loop = loop
+
+        return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def _get_client(self):
+
+        # only ever called on the client loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                ),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+                transport=self._transport,
+            )
+
+        return self._client
+
+    def _host_state(self, host):
+
+        if host not in self._limits:
+            self._limits[host] = asyncio.Semaphore(
+                HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT)
+            )
+            self._rates[host] = (
+                RateLimiter(HOST_RATES[host]) if host in HOST_RATES else None
+            )
+            self._breakers[host] = CircuitBreaker()
+            self._stats[host] = {
+                "requests": 0, "retries": 0, "errors": 0, "rejected": 0,
+            }
+
+        return (
+            self._limits[host], self._rates[host],
+            self._breakers[host], self._stats[host]
+        )
+
+    # ==================================================
+    # REQUEST (RUNS ON THE CLIENT LOOP)
+    # ==================================================
+
+    async def _request(self, method, url, retries, timeout, **kwargs):
+
+        host = urlsplit(url).hostname or ""
+
+        sem, rate, breaker, stats = self._host_state(host)
+
+        client = self._get_client()
+
+        retries = retries if method == "GET" else 0
+
+        for attempt in range(retries + 1):
+
+            if not breaker.allow():
+                stats["rejected"] += 1
+                raise CircuitOpenError(f"{host}: circuit open")
+
+            wait = None
+
+            # every attempt the breaker let through must end in
+            # success(), failure() or release(), or a half-open
+            # host would stay "probing" (rejected) forever
+            verdict = False
+
+            try:
+
+                async with sem:
+
+                    if rate is not None:
+                        await rate.wait()
+
+                    stats["requests"] += 1
+
+                    try:
+                        res = await client.request(
+                            method, url,
+                            timeout=timeout or DEFAULT_TIMEOUT,
+                            **kwargs
+                        )
+
+                    except httpx.HTTPError as e:
+                        breaker.failure()
+                        verdict = True
+                        stats["errors"] += 1
+                        error = UpstreamError(f"{host}: {type(e).__name__}: {e}")
+
+                    else:
+
+                        if res.status_code not in RETRY_STATUS:
+                            breaker.success()
+                            verdict = True
+                            return res
+
+                        breaker.failure()
+                        verdict = True
+                        stats["errors"] += 1
+
+                        error = UpstreamError(
+                            f"{host}: HTTP {res.status_code}",
+                            status_code=res.status_code,
+                            body=res.text,
+                        )
+
+                        wait = _retry_after(res)
+
+            finally:
+                if not verdict:
+                    breaker.release()
+
+            if attempt == retries:
+                raise error
+
+            stats["retries"] += 1
+
+            if wait is None:
+                wait = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+                wait *= 0.5 + random.random()
+
+            await asyncio.sleep(min(wait, BACKOFF_MAX))
+
+    async def _close(self):
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ==================================================
+    # PUBLIC API
+    # ==================================================
+
+    async def request(self, method, url, retries=DEFAULT_RETRIES, timeout=None, **kwargs):
+        """
+        Await from any event loop. Returns a fully read httpx.Response;
+        raises UpstreamError after retries / CircuitOpenError.
+        """
+
+        fut = self._submit(self._request(method, url, retries, timeout, **kwargs))
+
+        return await asyncio.wrap_future(fut)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def get_json(self, url, **kwargs):
+        return _json_or_raise(await self.get(url, **kwargs))
+
+    def request_sync(self, method, url, retries=DEFAULT_RETRIES, timeout=None, **kwargs):
+        """
+        Blocking variant for sync routes and worker threads
+        (must not be called from the client loop itself)
+        """
+
+        fut = self._submit(self._request(method, url, retries, timeout, **kwargs))
+
+        return fut.result()
+
+    def get_sync(self, url, **kwargs):
+        return self.request_sync("GET", url, **kwargs)
+
+    def get_json_sync(self, url, **kwargs):
+        return _json_or_raise(self.get_sync(url, **kwargs))
+
+    def close(self):
+
+        if self._loop is None:
+            return
+
+        self._submit(self._close()).result(timeout=10)
+
+    def status(self):
+        return {
+            host: {
+                **self._stats[host],
+                "circuit": self._breakers[host].state,
+                "consecutive_failures": self._breakers[host].failures,
+                "limit": HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT),
+            }
+            for host in list(self._stats)
+        }
+
+
+def _retry_after(res):
+
+    value = res.headers.get("Retry-After")
+
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _json_or_raise(res):
+
+    if res.status_code != 200:
+        raise UpstreamError(
+            f"HTTP {res.status_code}",
+            status_code=res.status_code,
+            body=res.text,
+        )
+
+    return res.json()
+
+
+http = HttpClient()
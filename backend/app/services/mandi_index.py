@@ -0,0 +1,168 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+from app.services.agmarknet_batch import market_key
+
+
+# ======================================================
+# NEAREST-MANDI SPATIAL INDEX
+# ======================================================
+# Locations of a curated set of major APMC markets from a
+# bundled CSV (ml/data/apmc_markets.csv: name, district,
+# state, lat, lon) in a haversine BallTree. It is not the
+# full Agmarknet market list, and coordinates are those of
+# the market town, not the yard gate; point APMC_MARKETS_CSV
+# at a fuller file to widen coverage.
+#
+# Names are matched by market_key(), the same key used for
+# Agmarknet rows, so "Pune(Pimpri)" or "Vashi" resolve here.
+# k-nearest queries are O(log n) and need no network call.
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(
+        os.path.dirname(__file__)
+    )
+)
+
+MARKETS_CSV = os.getenv(
+    "APMC_MARKETS_CSV",
+    os.path.join(BASE_DIR, "ml", "data", "apmc_markets.csv")
+)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Vectorized great-circle distance (km) from one point to arrays
+    """
+
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class MandiIndex:
+
+    def __init__(self, markets: pd.DataFrame):
+
+        markets = (
+            markets.dropna(subset=["name", "lat", "lon"])
+            .drop_duplicates(["name", "state"])
+            .reset_index(drop=True)
+        )
+
+        self.markets = markets
+
+        self.names = markets["name"].to_numpy()
+        self.states = markets["state"].fillna("").to_numpy()
+        self.districts = markets["district"].fillna("").to_numpy()
+
+        self._states_norm = np.array([s.strip().lower() for s in self.states])
+
+        self.lats = markets["lat"].to_numpy(dtype=np.float64)
+        self.lons = markets["lon"].to_numpy(dtype=np.float64)
+
+        self._tree = BallTree(
+            np.radians(np.column_stack([self.lats, self.lons])),
+            metric="haversine"
+        )
+
+        # market_key -> first row
+        self._by_name = {}
+
+        for i, name in enumerate(self.names):
+            self._by_name.setdefault(market_key(name), i)
+
+    @classmethod
+    def from_csv(cls, path=MARKETS_CSV):
+        return cls(pd.read_csv(path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _row(self, i, distance=None):
+
+        row = {
+            "mandi": self.names[i],
+            "district": self.districts[i],
+            "state": self.states[i],
+            "lat": float(self.lats[i]),
+            "lon": float(self.lons[i]),
+        }
+
+        if distance is not None:
+            row["air_distance_km"] = round(float(distance), 2)
+
+        return row
+
+    def lookup(self, name):
+        """
+        Market name (matched on market_key) -> (lat, lon) or None
+        """
+
+        i = self._by_name.get(market_key(name))
+
+        return None if i is None else (float(self.lats[i]), float(self.lons[i]))
+
+    def nearest_idx(self, lat, lon, k=5, state=None):
+        """
+        (row indices, distances km), nearest first
+        """
+
+        n = len(self)
+
+        if n == 0:
+            return np.array([], dtype=int), np.array([])
+
+        if state:
+
+            # filter first, then rank the (small) subset directly
+            idx = np.flatnonzero(self._states_norm == state.strip().lower())
+
+            dist = haversine_many(lat, lon, self.lats[idx], self.lons[idx])
+
+            order = np.argsort(dist, kind="stable")[:k]
+
+            return idx[order], dist[order]
+
+        k = min(k, n)
+
+        dist, idx = self._tree.query(
+            np.radians([[lat, lon]]), k=k
+        )
+
+        return idx[0], dist[0] * EARTH_RADIUS_KM
+
+    def nearest(self, lat, lon, k=5, state=None):
+
+        idx, dist = self.nearest_idx(lat, lon, k, state)
+
+        return [self._row(i, d) for i, d in zip(idx, dist)]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_mandi_index():
+
+    global _index
+
+    with _index_lock:
+
+        if _index is None:
+            _index = MandiIndex.from_csv()
+            print(f"📍 Mandi index: {len(_index)} markets")
+
+        return _index
@@ -0,0 +1,86 @@
+import os
+import math
+
+import numpy as np
+
+from app.services.mandi_index import haversine_many
+
+
+# ======================================================
+# NET REALIZATION (PRICE - TRANSPORT)
+# ======================================================
+# For a farmer at (lat, lon) shipping `quantity` quintals:
+#
+#   road_km   = air_km x learned road factor
+#   trips     = ceil(quantity / vehicle capacity)
+#   transport = loading + trips x rate_per_km x road_km / quantity
+#   net       = modal_price - transport          (Rs/quintal)
+#
+# All mandis are scored in one vectorized pass. Callers may
+# replace road_km / travel time for the leaders with real
+# routes and call score() again.
+
+RATE_PER_KM = float(os.getenv("TRANSPORT_RATE_PER_KM", "30"))        # Rs per vehicle-km
+VEHICLE_CAPACITY_QTL = float(os.getenv("VEHICLE_CAPACITY_QTL", "40"))  # ~4 t pickup
+LOADING_COST_QTL = float(os.getenv("LOADING_COST_QTL", "10"))        # Rs per quintal
+
+
+class CostModel:
+
+    __slots__ = ("rate_per_km", "capacity_qtl", "loading_qtl")
+
+    def __init__(self, rate_per_km=RATE_PER_KM,
+                 capacity_qtl=VEHICLE_CAPACITY_QTL,
+                 loading_qtl=LOADING_COST_QTL):
+
+        self.rate_per_km = rate_per_km
+        self.capacity_qtl = capacity_qtl
+        self.loading_qtl = loading_qtl
+
+    def per_quintal(self, road_km, quantity_qtl):
+        """
+        Rs/quintal to move `quantity_qtl` over road_km (array)
+        """
+
+        trips = math.ceil(quantity_qtl / self.capacity_qtl)
+
+        return (
+            self.loading_qtl
+            + trips * self.rate_per_km * np.asarray(road_km) / quantity_qtl
+        )
+
+    def to_dict(self):
+        return {
+            "rate_per_km": self.rate_per_km,
+            "vehicle_capacity_qtl": self.capacity_qtl,
+            "loading_cost_qtl": self.loading_qtl,
+        }
+
+
+def estimate_roads(lat, lon, lats, lons, road_factor, speed_kmh):
+    """
+    (air_km, road_km, travel_min) arrays
+    """
+
+    air = haversine_many(lat, lon, lats, lons)
+
+    road = air * road_factor
+
+    return air, road, road / speed_kmh * 60
+
+
+def score(prices, road_km, quantity_qtl, cost_model):
+    """
+    (transport Rs/qtl, net Rs/qtl, order best-first);
+    NaN prices sort last
+    """
+
+    prices = np.asarray(prices, dtype=np.float64)
+
+    transport = cost_model.per_quintal(road_km, quantity_qtl)
+
+    net = prices - transport
+
+    order = np.argsort(np.where(np.isnan(net), np.inf, -net), kind="stable")
+
+    return transport, net, order
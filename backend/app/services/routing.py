@@ -0,0 +1,203 @@
+import os
+import threading
+from math import radians, sin, cos, sqrt, atan2
+
+import httpx
+
+from app.services.http_client import http, UpstreamError
+from app.services.ttl_cache import TTLCache, make_backend
+
+
+# ======================================================
+# ROAD ROUTING (OSRM) WITH CACHE + FALLBACK
+# ======================================================
+# route() answers in this order:
+#
+#   1. cache   -- OSRM results keyed on both endpoints
+#                 rounded to a ROUTE_GRID degree grid
+#                 (0.01 deg ~ 1 km), so nearby origins share
+#   2. osrm    -- live OSRM route
+#   3. estimate -- haversine x learned road factor, with a
+#                 learned average speed for the duration
+#
+# Every live OSRM answer updates the road factor (road km /
+# air km) and the speed, so estimates track real routes.
+
+OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org")
+
+ROUTE_GRID = float(os.getenv("ROUTE_GRID_DEG", "0.01"))
+ROUTE_TTL = int(os.getenv("ROUTE_CACHE_TTL_HOURS", "168")) * 3600
+
+DEFAULT_ROAD_FACTOR = 1.3
+DEFAULT_SPEED_KMH = 40.0
+
+
+def haversine(lat1, lon1, lat2, lon2):
+
+    R = 6371
+
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1))
+        * cos(radians(lat2))
+        * sin(dlon / 2) ** 2
+    )
+
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    return round(R * c, 2)
+
+
+class RoadFactor:
+    """
+    Running means of road/air distance ratio and speed,
+    learned from live routes
+    """
+
+    MIN_AIR_KM = 1.0
+    MAX_SAMPLES = 500   # beyond this, behave like an EWMA
+
+    def __init__(self, factor=DEFAULT_ROAD_FACTOR, speed_kmh=DEFAULT_SPEED_KMH):
+
+        self.factor = factor
+        self.speed_kmh = speed_kmh
+        self.samples = 0
+
+        self._lock = threading.Lock()
+
+    def observe(self, air_km, road_km, duration_min):
+
+        if air_km < self.MIN_AIR_KM or road_km <= 0 or duration_min <= 0:
+            return
+
+        ratio = min(max(road_km / air_km, 1.0), 3.0)
+        speed = road_km / (duration_min / 60)
+
+        with self._lock:
+
+            self.samples += 1
+
+            w = 1 / min(self.samples, self.MAX_SAMPLES)
+
+            self.factor += w * (ratio - self.factor)
+            self.speed_kmh += w * (speed - self.speed_kmh)
+
+    def estimate(self, air_km):
+
+        road = air_km * self.factor
+
+        return {
+            "distance_km": round(road, 2),
+            "duration_min": round(road / self.speed_kmh * 60, 1),
+        }
+
+    def status(self):
+        return {
+            "road_factor": round(self.factor, 3),
+            "speed_kmh": round(self.speed_kmh, 1),
+            "samples": self.samples,
+        }
+
+
+road_factor = RoadFactor()
+
+route_cache = TTLCache(
+    name="osrm-routes",
+    ttl=ROUTE_TTL,
+    backend=make_backend(
+        os.getenv("ROUTE_CACHE_BACKEND", "memory"),   # memory | redis
+        url=os.getenv("ROUTE_CACHE_REDIS_URL"),
+        prefix="routes:",
+        max_entries=10000,
+    ),
+    # failed lookups fall through to the estimate, never cached
+    cacheable=lambda route: route is not None,
+)
+
+
+def _snap(x):
+    return round(round(x / ROUTE_GRID) * ROUTE_GRID, 6)
+
+
+def grid_key(lat1, lon1, lat2, lon2):
+    return ",".join(str(_snap(v)) for v in (lat1, lon1, lat2, lon2))
+
+
+async def get_osm_route(lat1, lon1, lat2, lon2):
+
+    url = f"{OSRM_URL}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}"
+
+    params = {
+        "overview": "false",
+        "steps": "false",
+    }
+
+    try:
+
+        res = await http.get(url, params=params, timeout=15)
+
+        if res.status_code != 200:
+            return None
+
+        data = res.json()
+
+        if data.get("code") != "Ok":
+            return None
+
+        route = data["routes"][0]
+
+        return {
+            "distance_km": round(route["distance"] / 1000, 2),
+            "duration_min": round(route["duration"] / 60, 1),
+        }
+
+    except (UpstreamError, httpx.HTTPError) as e:
+        print("❌ OSRM route failed:", e)
+        return None
+
+    except (KeyError, IndexError, ValueError) as e:
+        print("❌ OSRM response unreadable:", e)
+        return None
+
+
+async def route(lat1, lon1, lat2, lon2):
+    """
+    {"distance_km", "duration_min", "source": cache | osrm | estimate}
+    """
+
+    air = haversine(lat1, lon1, lat2, lon2)
+
+    key = grid_key(lat1, lon1, lat2, lon2)
+
+    # the value this caller's own fetch produced; coalesced
+    # waiters and cache hits never run fetch, so they see None
+    mine = None
+
+    async def fetch():
+
+        nonlocal mine
+
+        # query the grid cell centres so the cached value
+        # is the same whichever origin filled it
+        snapped = [_snap(v) for v in (lat1, lon1, lat2, lon2)]
+
+        r = await get_osm_route(*snapped)
+
+        if r is not None:
+            road_factor.observe(
+                haversine(*snapped), r["distance_km"], r["duration_min"]
+            )
+
+        mine = r
+
+        return r
+
+    r = await route_cache.get_or_fetch(key, fetch)
+
+    if r is not None:
+        return {**r, "source": "osrm" if r is mine else "cache"}
+
+    return {**road_factor.estimate(air), "source": "estimate"}
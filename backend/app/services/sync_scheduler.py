@@ -0,0 +1,387 @@
+import os
+import json
+import random
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pandas as pd
+from dotenv import load_dotenv
+
+from ml.store import get_store
+from app.services.sync_state import sync_state
+from app.services.http_client import RateLimiter
+
+
+load_dotenv()
+
+
+# ======================================================
+# CONFIG
+# ======================================================
+
+AGMARKET_URL = os.getenv(
+    "AGMARKNET_URL",
+    "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+)
+
+API_KEY = os.getenv("DATA_GOV_API_KEY")
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(
+        os.path.dirname(__file__)
+    )
+)
+
+WATCHLIST_PATH = os.getenv(
+    "SYNC_WATCHLIST",
+    os.path.join(BASE_DIR, "ml", "data", "sync_watchlist.json")
+)
+
+DEFAULT_WATCHLIST = {
+    "commodities": ["Onion", "Tomato", "Potato", "Wheat"],
+    "markets": [],             # empty = every market returned
+    "interval_minutes": 360,
+    "page_size": 500,
+    "concurrency": 4,          # in-flight requests
+    "rate_per_sec": 4,         # request rate cap
+    "max_retries": 4,
+}
+
+
+def load_watchlist(path=WATCHLIST_PATH):
+
+    config = dict(DEFAULT_WATCHLIST)
+
+    try:
+        with open(path, "r") as f:
+            config.update(json.load(f))
+
+    except FileNotFoundError:
+        pass
+
+    except Exception as e:
+        print("❌ Watchlist read failed:", e)
+
+    return config
+
+
+class RetryableError(Exception):
+    pass
+
+
+# ======================================================
+# SCHEDULER
+# ======================================================
+
+class AgmarknetSyncScheduler:
+
+    def __init__(self, base_url=AGMARKET_URL, api_key=API_KEY,
+                 watchlist_path=WATCHLIST_PATH, transport=None, store=None):
+
+        self.base_url = base_url
+        self.api_key = api_key
+        self.watchlist_path = watchlist_path
+
+        # injectable for stub servers / tests
+        self._transport = transport
+        self._store = store
+
+        self._task = None
+        self._manual = None     # one-off run when the loop is not started
+        self._running = asyncio.Lock()
+        self._wake = None
+
+        self.state = self._empty_state()
+        self.state["next_run"] = None
+        self.history = []
+
+    @staticmethod
+    def _empty_state():
+        return {
+            "running": False,
+            "started_at": None,
+            "finished_at": None,
+            "commodities_total": 0,
+            "commodities_done": 0,
+            "pages_total": 0,
+            "pages_done": 0,
+            "requests": 0,
+            "retries": 0,
+            "records": 0,
+            "rows_saved": 0,
+            "errors": [],
+        }
+
+    # ==================================================
+    # STATUS
+    # ==================================================
+
+    def status(self):
+
+        s = dict(self.state)
+
+        if s["started_at"]:
+
+            end = s["finished_at"] or datetime.now().isoformat()
+
+            seconds = max(
+                (datetime.fromisoformat(end) - datetime.fromisoformat(s["started_at"])).total_seconds(),
+                1e-6
+            )
+
+            s["elapsed_seconds"] = round(seconds, 2)
+            s["records_per_sec"] = round(s["records"] / seconds, 2)
+            s["requests_per_sec"] = round(s["requests"] / seconds, 2)
+
+        s["recent_runs"] = self.history[-5:]
+
+        return s
+
+    # ==================================================
+    # HTTP
+    # ==================================================
+
+    async def _get_page(self, client, limiter, sem, config, commodity, offset):
+
+        params = {
+            "api-key": self.api_key,
+            "format": "json",
+            "limit": config["page_size"],
+            "offset": offset,
+            "filters[commodity]": commodity,
+        }
+
+        retries = config["max_retries"]
+
+        for attempt in range(retries + 1):
+
+            async with sem:
+
+                await limiter.wait()
+
+                self.state["requests"] += 1
+
+                try:
+                    res = await client.get(self.base_url, params=params)
+
+                    if res.status_code == 429 or res.status_code >= 500:
+                        raise RetryableError(f"HTTP {res.status_code}")
+
+                    if res.status_code != 200:
+                        raise Exception(f"HTTP {res.status_code}")
+
+                    return res.json()
+
+                except (RetryableError, httpx.TransportError) as e:
+                    error = e
+
+            if attempt == retries:
+                raise Exception(f"{commodity}@{offset}: {error}")
+
+            self.state["retries"] += 1
+
+            # exponential backoff with jitter
+            await asyncio.sleep(min(30, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+
+    async def _sync_commodity(self, client, limiter, sem, config, commodity):
+
+        size = config["page_size"]
+
+        first = await self._get_page(client, limiter, sem, config, commodity, 0)
+
+        total = int(first.get("total") or 0)
+
+        pages = max(1, -(-total // size))
+
+        self.state["pages_total"] += pages
+        self.state["pages_done"] += 1
+
+        async def page(offset):
+            data = await self._get_page(client, limiter, sem, config, commodity, offset)
+            self.state["pages_done"] += 1
+            return data
+
+        rest = await asyncio.gather(*[
+            page(i * size) for i in range(1, pages)
+        ])
+
+        records = list(first.get("records", []))
+
+        for data in rest:
+            records.extend(data.get("records", []))
+
+        self.state["records"] += len(records)
+
+        markets = {m.strip().lower() for m in config.get("markets", [])}
+
+        if markets:
+            records = [
+                r for r in records
+                if (r.get("market") or "").strip().lower() in markets
+            ]
+
+        saved = await asyncio.to_thread(self._save, records)
+
+        self.state["rows_saved"] += saved
+        self.state["commodities_done"] += 1
+
+        print(f"✅ Sync {commodity}: {len(records)} records, {saved} new rows")
+
+    def _save(self, records):
+        """
+        One bulk append per commodity
+        """
+
+        if not records:
+            return 0
+
+        df = pd.DataFrame({
+            "date": [r.get("arrival_date") for r in records],
+            "crop": [r.get("commodity") for r in records],
+            "mandi": [r.get("market") for r in records],
+            "modal_price": pd.to_numeric([r.get("modal_price") for r in records], errors="coerce"),
+            "arrivals": pd.to_numeric([r.get("arrivals", 0) for r in records], errors="coerce"),
+        })
+
+        store = self._store or get_store()
+
+        saved = store.append(df)
+
+        # swept pairs count as fresh for /sync-live
+        dates = pd.to_datetime(df["date"], format="%d/%m/%Y", errors="coerce")
+
+        newest = (
+            df.assign(date=dates)
+            .dropna(subset=["date", "crop", "mandi"])
+            .groupby(["crop", "mandi"])["date"].max()
+        )
+
+        sync_state.mark_many({
+            pair: d.strftime("%Y-%m-%d") for pair, d in newest.items()
+        })
+
+        return saved
+
+    # ==================================================
+    # RUN
+    # ==================================================
+
+    async def run_once(self):
+
+        if self._running.locked():
+            return self.status()
+
+        async with self._running:
+
+            config = load_watchlist(self.watchlist_path)
+
+            self.state = {
+                **self._empty_state(),
+                "running": True,
+                "started_at": datetime.now().isoformat(),
+                "commodities_total": len(config["commodities"]),
+                "next_run": self.state.get("next_run"),
+            }
+
+            if not self.api_key:
+                self.state["errors"].append("DATA_GOV_API_KEY missing")
+
+            else:
+
+                limiter = RateLimiter(config["rate_per_sec"])
+                sem = asyncio.Semaphore(config["concurrency"])
+
+                async with httpx.AsyncClient(
+                    timeout=httpx.Timeout(30.0, connect=10.0),
+                    transport=self._transport,
+                ) as client:
+
+                    results = await asyncio.gather(*[
+                        self._sync_commodity(client, limiter, sem, config, c)
+                        for c in config["commodities"]
+                    ], return_exceptions=True)
+
+                for commodity, r in zip(config["commodities"], results):
+                    if isinstance(r, Exception):
+                        print(f"❌ Sync {commodity}:", r)
+                        self.state["errors"].append(f"{commodity}: {r}")
+
+            self.state["running"] = False
+            self.state["finished_at"] = datetime.now().isoformat()
+
+            summary = self.status()
+            summary.pop("recent_runs", None)
+
+            self.history = (self.history + [summary])[-20:]
+
+            return self.status()
+
+    async def run_forever(self):
+
+        self._wake = asyncio.Event()
+
+        while True:
+
+            try:
+                await self.run_once()
+            except Exception as e:
+                print("❌ Scheduler run failed:", e)
+
+            minutes = load_watchlist(self.watchlist_path)["interval_minutes"]
+
+            self.state["next_run"] = (
+                datetime.now() + timedelta(minutes=minutes)
+            ).isoformat()
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=minutes * 60)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wake.clear()
+
+    def start(self):
+
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+        return self._task
+
+    def trigger(self):
+        """
+        Run now (if the loop is started) instead of waiting
+        """
+
+        if self._wake is not None:
+            self._wake.set()
+            return True
+
+        return False
+
+    def run_in_background(self):
+        """
+        Wake the loop, or start a one-off run_once() task without
+        the loop. Never waits for the sweep. Returns the task (or
+        None when the loop was woken).
+        """
+
+        if self.trigger():
+            return None
+
+        if self._manual is None or self._manual.done():
+
+            # referenced here until done, so it cannot be collected
+            self._manual = asyncio.get_running_loop().create_task(self.run_once())
+            self._manual.add_done_callback(self._manual_done)
+
+        return self._manual
+
+    @staticmethod
+    def _manual_done(task):
+
+        if not task.cancelled() and task.exception() is not None:
+            print("❌ Manual sync failed:", task.exception())
+
+
+scheduler = AgmarknetSyncScheduler()
@@ -0,0 +1,234 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+
+
+# ======================================================
+# PER-(CROP, MANDI) SYNC FRESHNESS
+# ======================================================
+# One row per pair:
+#   "Onion|Pune": {
+#       "last_sync": iso time of the last upstream fetch,
+#       "watermark": newest arrival_date stored (YYYY-MM-DD),
+#       "ttl_hours": optional per-pair override,
+#       "status", "rows"
+#   }
+# Persisted as JSON (atomic replace) and re-read when another
+# worker has changed the file. Writers hold an flock() on
+# <file>.lock across re-read, modify and replace, so two
+# processes never drop each other's rows.
+
+
+def pair_key(crop: str, mandi: str):
+    return f"{crop.strip().lower()}|{mandi.strip().lower()}"
+
+
+class SyncStateTable:
+
+    def __init__(self, path, default_ttl_hours=6):
+
+        self.path = path
+        self.default_ttl = default_ttl_hours
+
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._mtime = None
+
+    def _reload(self, force=False):
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+
+        if mtime == self._mtime and not force:
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                self._rows = json.load(f)
+            self._mtime = mtime
+
+        except Exception as e:
+            print("❌ Sync state read failed:", e)
+
+    @contextmanager
+    def _writing(self):
+        """
+        Thread + cross-process lock around read-modify-write
+        """
+
+        with self._lock:
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            with open(self.path + ".lock", "a") as f:
+
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+
+                try:
+                    self._reload(force=True)
+                    yield
+                    self._save()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _save(self):
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        tmp = self.path + ".tmp"
+
+        with open(tmp, "w") as f:
+            json.dump(self._rows, f, indent=2)
+
+        os.replace(tmp, self.path)
+
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    # ==================================================
+    # READ
+    # ==================================================
+
+    def get(self, crop, mandi):
+
+        with self._lock:
+            self._reload()
+            return dict(self._rows.get(pair_key(crop, mandi), {}))
+
+    def all(self):
+
+        with self._lock:
+            self._reload()
+            return {k: dict(v) for k, v in self._rows.items()}
+
+    def is_fresh(self, crop, mandi, now=None):
+
+        row = self.get(crop, mandi)
+
+        if not row.get("last_sync"):
+            return False, row
+
+        now = now or datetime.now()
+
+        ttl = timedelta(hours=row.get("ttl_hours", self.default_ttl))
+
+        age = now - datetime.fromisoformat(row["last_sync"])
+
+        return age < ttl, row
+
+    # ==================================================
+    # WRITE
+    # ==================================================
+
+    def mark_synced(self, crop, mandi, watermark=None, status="success", rows=0):
+
+        with self._writing():
+
+            key = pair_key(crop, mandi)
+            row = self._rows.setdefault(key, {"crop": crop, "mandi": mandi})
+
+            row["last_sync"] = datetime.now().isoformat()
+            row["status"] = status
+            row["rows"] = rows
+
+            # watermark only moves forward
+            if watermark and watermark > row.get("watermark", ""):
+                row["watermark"] = watermark
+
+            return dict(row)
+
+    def mark_many(self, watermarks, status="success"):
+        """
+        Bulk version of mark_synced: {(crop, mandi): watermark}
+        """
+
+        with self._writing():
+
+            now = datetime.now().isoformat()
+
+            for (crop, mandi), watermark in watermarks.items():
+
+                key = pair_key(crop, mandi)
+                row = self._rows.setdefault(key, {"crop": crop, "mandi": mandi})
+
+                row["last_sync"] = now
+                row["status"] = status
+
+                if watermark and watermark > row.get("watermark", ""):
+                    row["watermark"] = watermark
+
+    def set_ttl(self, crop, mandi, ttl_hours):
+
+        with self._writing():
+
+            key = pair_key(crop, mandi)
+            row = self._rows.setdefault(key, {"crop": crop, "mandi": mandi})
+            row["ttl_hours"] = ttl_hours
+
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(
+        os.path.dirname(__file__)
+    )
+)
+
+STATE_FILE = os.path.join(BASE_DIR, "ml", "data", "sync_state.json")
+
+SYNC_INTERVAL_HOURS = 6   # default TTL per (crop, mandi)
+
+# shared by /sync-live and the background scheduler
+sync_state = SyncStateTable(STATE_FILE, SYNC_INTERVAL_HOURS)
+
+
+# ======================================================
+# SINGLE-FLIGHT
+# ======================================================
+# Concurrent callers with the same key share one execution:
+# the first runs fn(), the rest wait for its result.
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Returns (result, shared) where shared=True for waiters
+        """
+
+        with self._lock:
+
+            fut = self._calls.get(key)
+
+            if fut is not None:
+                leader = False
+            else:
+                fut = self._calls[key] = Future()
+                leader = True
+
+        if not leader:
+            return fut.result(), True
+
+        try:
+            fut.set_result(fn())
+
+        except BaseException as e:
+            fut.set_exception(e)
+
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+        return fut.result(), False
@@ -0,0 +1,271 @@
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:   # optional backend
+    redis = None
+
+
+# ======================================================
+# TTL CACHE WITH STALE-WHILE-REVALIDATE
+# ======================================================
+# Entries are {"value", "stored_at"}. For a key of age a:
+#
+#   a < ttl                 fresh hit
+#   a < ttl + stale_ttl     stale hit: returned at once and
+#                           refreshed in the background
+#   otherwise               miss: fetched (callers waiting
+#                           on the same key share one fetch)
+#
+# Storage is pluggable: an in-process LRU, or a local
+# Redis-compatible server (values must be JSON-serialisable).
+# Backends marked `blocking` do network I/O and are called
+# from a worker thread, never on the event loop.
+
+
+class MemoryBackend:
+
+    blocking = False
+
+    def __init__(self, max_entries=256):
+
+        self.max_entries = max_entries
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+
+        with self._lock:
+
+            entry = self._data.get(key)
+
+            if entry is not None:
+                self._data.move_to_end(key)
+
+            return entry
+
+    def set(self, key, entry, expire):
+
+        with self._lock:
+
+            self._data[key] = entry
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+
+    blocking = True
+
+    def __init__(self, url, prefix="cache:"):
+
+        if redis is None:
+            raise RuntimeError("redis package not installed")
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+
+        raw = self._client.get(self.prefix + key)
+
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, entry, expire):
+        self._client.set(self.prefix + key, json.dumps(entry), ex=max(1, int(expire)))
+
+    def clear(self):
+        for k in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(k)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(self.prefix + "*"))
+
+
+def make_backend(kind="memory", url=None, prefix="cache:", max_entries=256):
+    """
+    "redis" falls back to the in-process LRU when the server
+    or the client package is not available
+    """
+
+    if kind == "redis":
+
+        try:
+            backend = RedisBackend(url or "redis://localhost:6379/0", prefix)
+            backend._client.ping()
+            return backend
+
+        except Exception as e:
+            print("❌ Redis cache unavailable, using memory:", e)
+
+    return MemoryBackend(max_entries)
+
+
+class TTLCache:
+
+    def __init__(self, name, ttl, stale_ttl=0, backend=None, cacheable=None):
+
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self.backend = backend or MemoryBackend()
+
+        # values failing this check are returned but not stored
+        self.cacheable = cacheable or (lambda value: True)
+
+        self._inflight = {}
+        self._refreshing = set()
+
+        # background revalidations, held until done so they are
+        # not garbage-collected mid-flight
+        self._tasks = set()
+
+        self.metrics = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "errors": 0,
+        }
+
+    # ==================================================
+    # BACKEND ACCESS
+    # ==================================================
+
+    async def _get(self, key):
+
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.get, key)
+
+        return self.backend.get(key)
+
+    async def _set(self, key, entry, expire):
+
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.set, key, entry, expire)
+
+        return self.backend.set(key, entry, expire)
+
+    # ==================================================
+    # FETCH (SINGLE-FLIGHT)
+    # ==================================================
+
+    async def _fetch(self, key, fetch):
+
+        fut = self._inflight.get(key)
+
+        if fut is not None:
+            self.metrics["coalesced"] += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+
+        try:
+            value = await fetch()
+
+            if self.cacheable(value):
+                await self._set(
+                    key,
+                    {"value": value, "stored_at": time.time()},
+                    self.ttl + self.stale_ttl
+                )
+
+            fut.set_result(value)
+
+        except BaseException as e:
+            self.metrics["errors"] += 1
+            fut.set_exception(e)
+
+            # nobody else may be waiting; avoid "never retrieved" noise
+            fut.exception()
+
+            raise
+
+        finally:
+            self._inflight.pop(key, None)
+
+        return value
+
+    async def _revalidate(self, key, fetch):
+
+        try:
+            self.metrics["refreshes"] += 1
+            await self._fetch(key, fetch)
+
+        except Exception as e:
+            print(f"❌ {self.name} refresh failed ({key}):", e)
+
+        finally:
+            self._refreshing.discard(key)
+
+    # ==================================================
+    # PUBLIC
+    # ==================================================
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        fetch: zero-arg coroutine function producing the value
+        """
+
+        entry = await self._get(key)
+
+        if entry is not None:
+
+            age = time.time() - entry["stored_at"]
+
+            if age < self.ttl:
+                self.metrics["hits"] += 1
+                return entry["value"]
+
+            if age < self.ttl + self.stale_ttl:
+
+                self.metrics["stale_hits"] += 1
+
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+
+                    task = asyncio.get_running_loop().create_task(
+                        self._revalidate(key, fetch)
+                    )
+
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+                return entry["value"]
+
+        self.metrics["misses"] += 1
+
+        return await self._fetch(key, fetch)
+
+    def stats(self):
+
+        m = self.metrics
+
+        served = m["hits"] + m["stale_hits"] + m["misses"]
+
+        return {
+            "name": self.name,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "ttl_seconds": self.ttl,
+            "stale_seconds": self.stale_ttl,
+            **m,
+            "hit_rate": round((m["hits"] + m["stale_hits"]) / served, 4) if served else None,
+        }
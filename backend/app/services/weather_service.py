@@ -1,4 +1,6 @@
-import os, requests
+import os
+from app.services.http_client import http
+
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
 def get_weather_hourly_daily(lat: float, lon: float):
@@ -10,6 +12,7 @@ def get_weather_hourly_daily(lat: float, lon: float):
         "units": "metric",
         "exclude": "minutely,alerts"
     }
-    res = requests.get(url, params=params, timeout=10)
+    # sync callers (pymongo routes) -> blocking entry of the shared client
+    res = http.get_sync(url, params=params, timeout=10)
     res.raise_for_status()
     return res.json()
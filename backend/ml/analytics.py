@@ -0,0 +1,360 @@
+import threading
+
+import numpy as np
+
+from ml.price_index import get_price_index
+
+
+# ======================================================
+# PRICE SIGNALS (ALL SERIES AT ONCE)
+# ======================================================
+# The last WINDOW prices of every series are right-aligned
+# in one (series x WINDOW) matrix, NaN-padded on the left
+# for short series, and every signal is a column-wise NumPy
+# reduction over that matrix:
+#
+#   change_pct       first -> last move over the window
+#   trend            UP / DOWN / SIDEWAYS (+-TREND_PCT)
+#   return_1d / 5d   latest simple returns
+#   ewma_fast/slow   EWMA levels; ewma_trend = fast vs slow (%)
+#   volatility       std / mean (%)
+#   return_vol       std of daily returns (%)
+#   support / resistance   10th / 90th percentile of the window
+#
+# SignalTable caches the result per price-index version.
+
+WINDOW = 20
+TREND_PCT = 2.0
+
+EWMA_FAST = 5
+EWMA_SLOW = 20
+
+BAND_PCT = (10, 90)
+
+MIN_POINTS = 5
+
+
+def price_matrix(series_list, window=WINDOW):
+    """
+    Right-aligned (n, window) float matrix of the newest prices
+    """
+
+    out = np.full((len(series_list), window), np.nan)
+
+    for i, prices in enumerate(series_list):
+
+        tail = np.asarray(prices, dtype=np.float64)[-window:]
+
+        if len(tail):
+            out[i, window - len(tail):] = tail
+
+    return out
+
+
+def _ewma(m, span):
+    """
+    Row-wise EWMA that starts at each row's first valid price
+    """
+
+    alpha = 2.0 / (span + 1)
+
+    level = np.full(len(m), np.nan)
+
+    for col in m.T:
+
+        valid = ~np.isnan(col)
+
+        level = np.where(
+            np.isnan(level),
+            col,
+            np.where(valid, alpha * col + (1 - alpha) * level, level)
+        )
+
+    return level
+
+
+def _first_valid(m):
+
+    valid = ~np.isnan(m)
+
+    idx = valid.argmax(axis=1)
+
+    first = m[np.arange(len(m)), idx]
+
+    first[~valid.any(axis=1)] = np.nan
+
+    return first
+
+
+def compute_signals(m):
+    """
+    m: right-aligned price matrix -> dict of per-row arrays
+    """
+
+    n = (~np.isnan(m)).sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+
+        first = _first_valid(m)
+        last = m[:, -1]
+
+        avg = np.nanmean(m, axis=1)
+
+        change = (last - first) / np.maximum(first, 1) * 100
+
+        trend = np.where(
+            change > TREND_PCT, "UP",
+            np.where(change < -TREND_PCT, "DOWN", "SIDEWAYS")
+        )
+
+        volatility = np.nanstd(m, axis=1) / np.maximum(avg, 1) * 100
+
+        returns = m[:, 1:] / m[:, :-1] - 1
+
+        return_1d = returns[:, -1] * 100
+        return_5d = (last / m[:, -6] - 1) * 100
+        return_vol = np.nanstd(returns, axis=1) * 100
+
+        fast = _ewma(m, EWMA_FAST)
+        slow = _ewma(m, EWMA_SLOW)
+
+        ewma_trend = (fast - slow) / np.maximum(slow, 1) * 100
+
+        support, resistance = np.nanpercentile(m, BAND_PCT, axis=1)
+
+    return {
+        "points": n,
+        "last_price": last,
+        "average_price": avg,
+        "highest": np.nanmax(m, axis=1),
+        "lowest": np.nanmin(m, axis=1),
+        "change_pct": change,
+        "trend": trend,
+        "volatility": volatility,
+        "return_1d": return_1d,
+        "return_5d": return_5d,
+        "return_vol": return_vol,
+        "ewma_fast": fast,
+        "ewma_slow": slow,
+        "ewma_trend": ewma_trend,
+        "support": support,
+        "resistance": resistance,
+    }
+
+
+def _row(signals, i):
+
+    row = {}
+
+    for key, values in signals.items():
+
+        v = values[i]
+
+        if key == "trend":
+            row[key] = str(v)
+        elif key == "points":
+            row[key] = int(v)
+        else:
+            row[key] = None if np.isnan(v) else round(float(v), 2)
+
+    return row
+
+
+def signal_rows(series_list, window=WINDOW):
+    """
+    [prices] -> [signal dict]; used for ad-hoc (merged) series
+    """
+
+    if not series_list:
+        return []
+
+    signals = compute_signals(price_matrix(series_list, window))
+
+    return [_row(signals, i) for i in range(len(series_list))]
+
+
+# ======================================================
+# CHART DOWNSAMPLING
+# ======================================================
+# ohlc(): calendar buckets (day / week starting Monday /
+# month) over a date-sorted series, via reduceat.
+# lttb(): Largest-Triangle-Three-Buckets, keeps the visual
+# shape of a line with n points.
+
+INTERVALS = ("daily", "weekly", "monthly")
+
+
+def bucket_starts(dates, interval):
+    """
+    datetime64[D] dates -> datetime64[D] bucket start per row
+    """
+
+    dates = dates.astype("datetime64[D]")
+
+    if interval == "daily":
+        return dates
+
+    if interval == "weekly":
+        # 1970-01-01 was a Thursday; shift to the Monday
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+
+    if interval == "monthly":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+
+    raise ValueError(f"Unknown interval: {interval}")
+
+
+def ohlc(dates, prices, interval="daily", volume=None):
+    """
+    Date-sorted series -> dict of per-bucket arrays
+    (date, open, high, low, close, count[, volume])
+    """
+
+    prices = np.asarray(prices, dtype=np.float64)
+
+    keys = bucket_starts(np.asarray(dates), interval)
+
+    if len(keys) == 0:
+        empty = np.array([], dtype=np.float64)
+        return {"date": keys, "open": empty, "high": empty,
+                "low": empty, "close": empty, "count": empty}
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    out = {
+        "date": keys[starts],
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends],
+        "count": np.diff(np.r_[starts, len(keys)]),
+    }
+
+    if volume is not None:
+        out["volume"] = np.add.reduceat(
+            np.nan_to_num(np.asarray(volume, dtype=np.float64)), starts
+        )
+
+    return out
+
+
+def lttb(x, y, n):
+    """
+    Indices of the n points LTTB keeps (always first and last)
+    """
+
+    size = len(y)
+
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n - 2 buckets between the fixed end points
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+
+    keep = np.empty(n, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = size - 1
+
+    a = 0
+
+    for i in range(n - 2):
+
+        lo, hi = edges[i], edges[i + 1]
+
+        # average of the next bucket (or the last point)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+
+    return keep
+
+
+# ======================================================
+# CACHE PER DATA VERSION
+# ======================================================
+
+class SignalTable:
+
+    def __init__(self, index=None, window=WINDOW):
+
+        self._index = index
+        self.window = window
+
+        self._lock = threading.Lock()
+
+        self._rows = {}
+        self.version = None
+
+    @property
+    def index(self):
+        return self._index or get_price_index()
+
+    def refresh(self):
+
+        self.index.refresh()
+
+        version = self.index.version
+
+        if version == self.version:
+            return False
+
+        with self._lock:
+
+            if version == self.version:
+                return False
+
+            pairs = self.index.pairs()
+
+            rows = signal_rows(
+                [self.index.get(c, m).prices for c, m in pairs],
+                self.window
+            )
+
+            self._rows = dict(zip(pairs, rows))
+            self.version = version
+
+        return True
+
+    def get(self, crop, mandi):
+
+        self.refresh()
+
+        return self._rows.get((crop, mandi))
+
+    def all(self, crop=None, min_points=MIN_POINTS):
+
+        self.refresh()
+
+        return [
+            {"crop": c, "mandi": m, **row}
+            for (c, m), row in self._rows.items()
+            if (crop is None or c == crop) and row["points"] >= min_points
+        ]
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_signal_table():
+
+    global _table
+
+    with _table_lock:
+
+        if _table is None:
+            _table = SignalTable()
+
+        return _table
@@ -0,0 +1,76 @@
+import pandas as pd
+
+
+# ======================================================
+# STABLE CATEGORY ENCODER
+# ======================================================
+# Append-only vocabulary: a value keeps its code forever,
+# new values get the next free code. Built with the model,
+# persisted next to it and looked up with a dict at
+# inference time.
+
+UNKNOWN = -1
+
+
+class CategoryEncoder:
+
+    def __init__(self, vocab=None):
+        self.vocab = dict(vocab or {})
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def fit(self, values):
+        """
+        Extend the vocabulary with unseen values (in order of appearance)
+        """
+
+        for v in pd.unique(pd.Series(values).dropna()):
+            if v not in self.vocab:
+                self.vocab[v] = len(self.vocab)
+
+        return self
+
+    def encode(self, value):
+        return self.vocab.get(value, UNKNOWN)
+
+    def transform(self, values):
+        return (
+            pd.Series(values)
+            .map(self.vocab)
+            .fillna(UNKNOWN)
+            .astype("int32")
+        )
+
+    def copy(self):
+        return CategoryEncoder(self.vocab)
+
+    # ==================================================
+    # PERSIST
+    # ==================================================
+
+    def to_dict(self):
+        return dict(self.vocab)
+
+    @classmethod
+    def from_dict(cls, vocab):
+        return cls(vocab)
+
+
+def fit_encoders(df, columns, previous=None):
+    """
+    Encoders for `columns`, extending `previous` so codes stay stable
+    across retrains.
+    """
+
+    previous = previous or {}
+
+    encoders = {}
+
+    for col in columns:
+
+        enc = previous[col].copy() if col in previous else CategoryEncoder()
+
+        encoders[col] = enc.fit(df[col])
+
+    return encoders
@@ -1,22 +1,327 @@
+import numpy as np
 import pandas as pd
 
-def create_features(df: pd.DataFrame):
-    df = df.copy()
-    df["date"] = pd.to_datetime(df["date"])
+FEATURE_COLS = [
+    "arrivals", "temp", "rain", "humidity", "festival",
+    "day", "month", "weekday", "weekofyear",
+    "price_lag1", "price_lag7", "arrivals_lag1",
+    "price_roll7", "arrivals_roll7"
+]
+
+# raw per-row inputs kept by the feature store
+RAW_COLS = ["modal_price", "arrivals", "temp", "rain", "humidity", "festival"]
+
+SERIES_KEYS = ["crop", "mandi"]
+
+# longest look-back (lag7 / roll7): first rows with full features
+WINDOW = 7
+
+_EXOG = [RAW_COLS.index(c) for c in ["arrivals", "temp", "rain", "humidity", "festival"]]
+_F = {name: i for i, name in enumerate(FEATURE_COLS)}
+
+
+# ======================================================
+# FEATURE KERNEL
+# ======================================================
+# Fills feats[lo:hi] for ONE date-sorted series, only
+# looking back WINDOW rows before lo. Shared by the
+# DataFrame API and the incremental store.
+
+def _fill_features(dates, raw, feats, lo, hi):
+
+    if hi <= lo:
+        return
+
+    rows = np.arange(lo, hi)
+
+    feats[lo:hi, :len(_EXOG)] = raw[lo:hi, _EXOG]
 
     # ✅ time based features
-    df["day"] = df["date"].dt.day
-    df["month"] = df["date"].dt.month
-    df["weekday"] = df["date"].dt.weekday
-    df["weekofyear"] = df["date"].dt.isocalendar().week.astype(int)
+    d = pd.DatetimeIndex(dates[lo:hi])
+
+    feats[lo:hi, _F["day"]] = d.day
+    feats[lo:hi, _F["month"]] = d.month
+    feats[lo:hi, _F["weekday"]] = d.weekday
+    feats[lo:hi, _F["weekofyear"]] = d.isocalendar().week.to_numpy()
 
     # ✅ rolling features (past data)
-    df["price_lag1"] = df["modal_price"].shift(1)
-    df["price_lag7"] = df["modal_price"].shift(7)
-    df["arrivals_lag1"] = df["arrivals"].shift(1)
+    start = max(0, lo - WINDOW)
+
+    price = raw[start:hi, 0].astype(np.float64)
+    arrivals = raw[start:hi, 1].astype(np.float64)
+
+    cp = np.concatenate(([0.0], np.cumsum(price)))
+    ca = np.concatenate(([0.0], np.cumsum(arrivals)))
+
+    r = rows - start
+
+    lag1 = rows >= 1
+    full = rows >= WINDOW
+
+    feats[lo:hi, _F["price_lag1"]] = np.where(lag1, price[np.maximum(r - 1, 0)], np.nan)
+    feats[lo:hi, _F["arrivals_lag1"]] = np.where(lag1, arrivals[np.maximum(r - 1, 0)], np.nan)
+    feats[lo:hi, _F["price_lag7"]] = np.where(full, price[np.maximum(r - WINDOW, 0)], np.nan)
+
+    # price window ends at yesterday: today's price is the target
+    feats[lo:hi, _F["price_roll7"]] = np.where(
+        full,
+        (cp[r] - cp[np.maximum(r - WINDOW, 0)]) / WINDOW,
+        np.nan
+    )
+
+    feats[lo:hi, _F["arrivals_roll7"]] = np.where(
+        rows >= WINDOW - 1,
+        (ca[r + 1] - ca[np.maximum(r + 1 - WINDOW, 0)]) / WINDOW,
+        np.nan
+    )
+
+
+def _parse_dates(values):
+    return pd.to_datetime(values, errors="coerce")
+
+
+def _series_groups(df):
+
+    keys = [k for k in SERIES_KEYS if k in df.columns]
+
+    if not keys:
+        return [((None, None), df)]
 
-    df["price_roll7"] = df["modal_price"].rolling(7).mean()
-    df["arrivals_roll7"] = df["arrivals"].rolling(7).mean()
+    return df.groupby(keys, sort=False, dropna=False)
 
-    df = df.dropna().reset_index(drop=True)
+
+# ======================================================
+# DATAFRAME API
+# ======================================================
+
+def create_features(df: pd.DataFrame):
+    """
+    Lag / rolling features computed per (crop, mandi) series,
+    so lags never bleed across crops or mandis.
+    """
+
+    dates = _parse_dates(df["date"])
+    df = df.assign(date=dates)
+    df = df[dates.notna().to_numpy()]
+
+    parts = []
+
+    for _, g in _series_groups(df):
+
+        g = g.sort_values("date", kind="stable")
+
+        raw = g[RAW_COLS].to_numpy(dtype=np.float32)
+        feats = np.empty((len(g), len(FEATURE_COLS)), dtype=np.float32)
+
+        _fill_features(g["date"].to_numpy("datetime64[D]"), raw, feats, 0, len(g))
+
+        parts.append(g.assign(**{
+            col: feats[:, i] for i, col in enumerate(FEATURE_COLS)
+        }))
+
+    if not parts:
+        return df.iloc[0:0]
+
+    df = pd.concat(parts)
+
+    df = df.dropna(subset=FEATURE_COLS).reset_index(drop=True)
     return df
+
+
+# ======================================================
+# INCREMENTAL FEATURE STORE
+# ======================================================
+
+class _Series:
+
+    __slots__ = ("dates", "raw", "feats", "n")
+
+    def __init__(self, capacity=64):
+        self.dates = np.empty(capacity, dtype="datetime64[D]")
+        self.raw = np.empty((capacity, len(RAW_COLS)), dtype=np.float32)
+        self.feats = np.empty((capacity, len(FEATURE_COLS)), dtype=np.float32)
+        self.n = 0
+
+    def _reserve(self, extra):
+
+        need = self.n + extra
+
+        if need <= len(self.dates):
+            return
+
+        capacity = max(need, 2 * len(self.dates))
+
+        for name in ("dates", "raw", "feats"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def append(self, dates, raw):
+
+        k = len(dates)
+        lo = self.n
+
+        self._reserve(k)
+
+        self.dates[lo:lo + k] = dates
+        self.raw[lo:lo + k] = raw
+        self.n += k
+
+        if lo and dates.min() < self.dates[lo - 1]:
+            # out-of-order rows: re-sort and rebuild this series
+            order = np.argsort(self.dates[:self.n], kind="stable")
+            self.dates[:self.n] = self.dates[:self.n][order]
+            self.raw[:self.n] = self.raw[:self.n][order]
+            lo = 0
+
+        _fill_features(self.dates, self.raw, self.feats, lo, self.n)
+
+
+class FeatureStore:
+    """
+    Per-(crop, mandi) feature matrices that only compute the
+    new tail when rows are appended.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.version = None
+
+    @classmethod
+    def from_frame(cls, df):
+        store = cls()
+        store.append(df)
+        return store
+
+    def __len__(self):
+        return sum(s.n for s in self.series.values())
+
+    def keys(self):
+        return list(self.series)
+
+    def append(self, df: pd.DataFrame):
+        """
+        Add rows (any mix of series). Returns rows added.
+        """
+
+        dates = _parse_dates(df["date"])
+        df = df.assign(date=dates)
+        df = df[dates.notna().to_numpy()]
+
+        added = 0
+
+        for key, g in _series_groups(df):
+
+            key = tuple(key) if isinstance(key, tuple) else (key, None)
+
+            if len(g) > 1:
+                g = g.sort_values("date", kind="stable")
+
+            s = self.series.get(key)
+
+            if s is None:
+                s = self.series[key] = _Series(max(64, len(g)))
+
+            s.append(
+                g["date"].to_numpy("datetime64[D]"),
+                g[RAW_COLS].to_numpy(dtype=np.float32)
+            )
+
+            added += len(g)
+
+        return added
+
+    def sync(self, index):
+        """
+        Bring every series in line with a PriceIndex. Series that
+        only grew get their new tail featurized; a series whose
+        known prefix changed (backfill, rewrite) is rebuilt.
+        Returns rows featurized.
+        """
+
+        pairs = index.pairs()
+
+        if index.version == self.version:
+            return 0
+
+        for key in set(self.series) - set(pairs):
+            del self.series[key]
+
+        added = 0
+
+        for key in pairs:
+
+            ps = index.get(*key)
+            s = self.series.get(key)
+
+            n = 0 if s is None else s.n
+
+            # dates are strictly increasing, so an insert anywhere
+            # before n moves the date at n - 1
+            if n and (
+                n > len(ps)
+                or ps.dates[n - 1] != s.dates[n - 1]
+                or np.float32(ps.prices[n - 1]) != s.raw[n - 1, 0]
+            ):
+                n = 0
+
+            if n == 0:
+                s = self.series[key] = _Series(max(64, len(ps)))
+
+            if n == len(ps):
+                continue
+
+            s.append(
+                ps.dates[n:],
+                np.column_stack([ps.values[c][n:] for c in RAW_COLS]).astype(np.float32)
+            )
+
+            added += len(ps) - n
+
+        self.version = index.version
+
+        return added
+
+    def arrays(self, crop=None, mandi=None):
+        """
+        (X, y, dates) for one series: float32 views, rows with a
+        full look-back window only. No copies.
+        """
+
+        s = self.series.get((crop, mandi))
+
+        if s is None or s.n <= WINDOW:
+            return (
+                np.empty((0, len(FEATURE_COLS)), dtype=np.float32),
+                np.empty(0, dtype=np.float32),
+                np.empty(0, dtype="datetime64[D]"),
+            )
+
+        return (
+            s.feats[WINDOW:s.n],
+            s.raw[WINDOW:s.n, 0],
+            s.dates[WINDOW:s.n],
+        )
+
+    def training_arrays(self):
+        """
+        (X, y, dates) stacked across every series (one concatenate),
+        rows with missing inputs dropped
+        """
+
+        parts = [self.arrays(*key) for key in self.series]
+
+        if not parts:
+            return self.arrays()
+
+        X = np.concatenate([p[0] for p in parts])
+        y = np.concatenate([p[1] for p in parts])
+        dates = np.concatenate([p[2] for p in parts])
+
+        ok = ~(np.isnan(X).any(axis=1) | np.isnan(y))
+
+        if not ok.all():
+            X, y, dates = X[ok], y[ok], dates[ok]
+
+        return X, y, dates
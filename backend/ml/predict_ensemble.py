@@ -1,9 +1,23 @@
 import os
+import json
+import threading
+from collections import deque
+
 import joblib
+import numpy as np
 import pandas as pd
 
-PROPHET_PATH = os.path.join("ml", "models", "prophet.joblib")
-XGB_PATH = os.path.join("ml", "models", "xgb.joblib")
+from ml.features import FEATURE_COLS
+from ml.festivals import is_festival
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+
+PROPHET_PATH = os.path.join(MODELS_DIR, "prophet.joblib")
+XGB_PATH = os.path.join(MODELS_DIR, "xgb.joblib")
+
+# per-series models written by ml.train_prophet.train_all
+PROPHET_DIR = os.path.join(MODELS_DIR, "prophet")
+PROPHET_MANIFEST = os.path.join(PROPHET_DIR, "manifest.json")
 
 
 def _safe_load(path: str):
@@ -15,29 +29,196 @@ def _safe_load(path: str):
     return None
 
 
+# ----------------------------
+# ✅ Process-wide model cache
+# ----------------------------
+# path -> (mtime_ns, model). A model is unpickled once and
+# reused until the file on disk changes (hot reload).
+
+_MODEL_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def load_model(path: str):
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        _MODEL_CACHE.pop(path, None)
+        return None
+
+    hit = _MODEL_CACHE.get(path)
+
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+
+    with _CACHE_LOCK:
+
+        # another thread may have loaded it meanwhile
+        hit = _MODEL_CACHE.get(path)
+
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+
+        model = _safe_load(path)
+
+        # failures are cached too, retried once the file changes
+        _MODEL_CACHE[path] = (mtime, model)
+
+        if model is not None:
+            print(f"✅ Model cached: {path}")
+
+        return model
+
+
+_manifest = {"mtime": None, "series": {}}
+
+
+def prophet_path_for(crop, mandi):
+    """
+    Per-series Prophet model if one was trained, else the shared one
+    """
+
+    try:
+        mtime = os.stat(PROPHET_MANIFEST).st_mtime_ns
+    except OSError:
+        return PROPHET_PATH
+
+    if _manifest["mtime"] != mtime:
+        try:
+            with open(PROPHET_MANIFEST, "r") as f:
+                _manifest["series"] = json.load(f).get("series", {})
+            _manifest["mtime"] = mtime
+        except Exception as e:
+            print(f"❌ Prophet manifest read failed -> {e}")
+
+    entry = _manifest["series"].get(f"{crop}|{mandi}")
+
+    if entry is None:
+        return PROPHET_PATH
+
+    return os.path.join(PROPHET_DIR, entry["path"])
+
+
+def warm_up(paths=(PROPHET_PATH, XGB_PATH)):
+    """
+    Load models at startup so the first request does not pay for it
+    """
+
+    return {path: load_model(path) is not None for path in paths}
+
+
+# ----------------------------
+# ✅ Recursive XGB forecaster
+# ----------------------------
+# Lag / rolling features are carried forward in fixed-size
+# windows, so each future day costs O(1) to featurize plus
+# one small predict: total cost is linear in `days` and never
+# re-runs create_features over the history.
+
+WINDOW = 7
+
+
+def _predict_row(model, row):
+
+    # inplace_predict skips DMatrix construction for one row
+    if hasattr(model, "get_booster"):
+        return float(model.get_booster().inplace_predict(row)[0])
+
+    return float(model.predict(row)[0])
+
+
+def xgb_recursive_forecast(model, history: pd.DataFrame, future_dates):
+    """
+    history: date-sorted rows with modal_price, arrivals,
+    temp, rain, humidity (at least WINDOW of them)
+    """
+
+    if len(history) < WINDOW:
+        raise ValueError(f"XGB needs at least {WINDOW} rows of history")
+
+    tail = history.tail(WINDOW)
+
+    prices = deque(tail["modal_price"].astype(float), maxlen=WINDOW)
+    arrivals = deque(tail["arrivals"].astype(float), maxlen=WINDOW)
+
+    price_sum = sum(prices)
+
+    last = tail.iloc[-1]
+
+    # exogenous inputs are carried forward from the last day
+    arrival = float(last["arrivals"])
+    temp = float(last["temp"])
+    rain = float(last["rain"])
+    humidity = float(last["humidity"])
+
+    arrivals_roll = (sum(arrivals) - arrivals[0] + arrival) / WINDOW
+
+    row = np.empty((1, len(FEATURE_COLS)), dtype=np.float32)
+    col = {name: i for i, name in enumerate(FEATURE_COLS)}
+
+    out = np.empty(len(future_dates))
+
+    for step, date in enumerate(future_dates):
+
+        row[0, col["arrivals"]] = arrival
+        row[0, col["temp"]] = temp
+        row[0, col["rain"]] = rain
+        row[0, col["humidity"]] = humidity
+        row[0, col["festival"]] = is_festival(date.strftime("%Y-%m-%d"))
+
+        row[0, col["day"]] = date.day
+        row[0, col["month"]] = date.month
+        row[0, col["weekday"]] = date.weekday()
+        row[0, col["weekofyear"]] = date.isocalendar()[1]
+
+        row[0, col["price_lag1"]] = prices[-1]
+        row[0, col["price_lag7"]] = prices[0]
+        row[0, col["arrivals_lag1"]] = arrivals[-1]
+        row[0, col["price_roll7"]] = price_sum / WINDOW
+        row[0, col["arrivals_roll7"]] = arrivals_roll
+
+        price = _predict_row(model, row)
+        out[step] = price
+
+        # slide the windows by one day
+        price_sum += price - prices[0]
+        prices.append(price)
+        arrivals.append(arrival)
+
+        arrivals_roll = (sum(arrivals) - arrivals[0] + arrival) / WINDOW
+
+    return out
+
+
 def ensemble_predict(df: pd.DataFrame, mandi: str, days: int = 7):
     """
     ✅ Works even if xgb.joblib missing
     Prophet required, XGB optional (fallback to prophet only)
     """
 
-    prophet = _safe_load(PROPHET_PATH)
-    xgb = _safe_load(XGB_PATH)
+    crop = df["crop"].iloc[-1] if "crop" in df.columns and len(df) else None
+
+    prophet = load_model(prophet_path_for(crop, mandi))
+    xgb = load_model(XGB_PATH)
 
     if prophet is None:
         raise FileNotFoundError("Prophet model missing: ml/models/prophet.joblib")
 
     # ----------------------------
-    # ✅ Prepare for prophet
+    # ✅ Prepare history + horizon
     # ----------------------------
-    data = df[["date", "modal_price"]].copy()
+    data = df.copy()
     data["date"] = pd.to_datetime(data["date"])
     data = data.sort_values("date")
 
-    prophet_df = data.rename(columns={"date": "ds", "modal_price": "y"})
+    future_dates = pd.date_range(
+        data["date"].max() + pd.Timedelta(days=1),
+        periods=days,
+        freq="D"
+    )
 
-    future = prophet.make_future_dataframe(periods=days)
-    fc = prophet.predict(future).tail(days)
+    fc = prophet.predict(pd.DataFrame({"ds": future_dates}))
 
     # Prophet output
     result = pd.DataFrame({
@@ -50,9 +231,12 @@ def ensemble_predict(df: pd.DataFrame, mandi: str, days: int = 7):
     # ----------------------------
     # ✅ XGB (optional)
     # ----------------------------
+    if xgb is not None and len(data) < WINDOW:
+        print(f"⚠️ XGB skipped: needs {WINDOW} rows, got {len(data)}")
+        xgb = None
+
     if xgb is not None:
-        # minimal fake features (until you add proper features.py)
-        result["xgb_price"] = result["prophet_price"] * 1.01
+        result["xgb_price"] = xgb_recursive_forecast(xgb, data, future_dates)
     else:
         result["xgb_price"] = 0.0
 
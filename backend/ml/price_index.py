@@ -0,0 +1,261 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ml.store import get_store
+
+
+# ======================================================
+# IN-MEMORY PRICE INDEX
+# ======================================================
+# Every (crop, mandi) series held as sorted NumPy arrays:
+#
+#   dates   datetime64[D], ascending, one row per day
+#   values  {"modal_price": float64[], "arrivals": ..., ...}
+#
+# All series are slices (views) of one sorted frame, so the
+# index costs about one copy of the numeric columns. It is
+# built once and rebuilt only when the store's _version.json
+# changes (one stat() per lookup). tail(n) is a slice and
+# date ranges are two searchsorted() calls -- no disk I/O.
+
+VALUE_COLS = ["modal_price", "arrivals", "temp", "rain", "humidity", "festival"]
+
+
+class PriceSeries:
+
+    __slots__ = ("crop", "mandi", "dates", "values")
+
+    def __init__(self, crop, mandi, dates, values):
+        self.crop = crop
+        self.mandi = mandi
+        self.dates = dates
+        self.values = values
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def prices(self):
+        return self.values["modal_price"]
+
+    def _slice(self, lo, hi):
+        return PriceSeries(
+            self.crop,
+            self.mandi,
+            self.dates[lo:hi],
+            {k: v[lo:hi] for k, v in self.values.items()}
+        )
+
+    def tail(self, n):
+        return self._slice(max(0, len(self) - n), len(self))
+
+    def between(self, start=None, end=None):
+        """
+        Inclusive date bounds, O(log n)
+        """
+
+        lo = 0 if start is None else np.searchsorted(
+            self.dates, np.datetime64(pd.Timestamp(start).date(), "D"), "left"
+        )
+
+        hi = len(self) if end is None else np.searchsorted(
+            self.dates, np.datetime64(pd.Timestamp(end).date(), "D"), "right"
+        )
+
+        return self._slice(lo, hi)
+
+    def last(self):
+        """
+        Newest row as {"date": Timestamp, column: float}
+        """
+
+        row = {k: float(v[-1]) for k, v in self.values.items()}
+        row["date"] = pd.Timestamp(self.dates[-1])
+
+        return row
+
+    def records(self):
+        """
+        [{"date": Timestamp, "modal_price": float}] (legacy row shape)
+        """
+
+        return [
+            {"date": pd.Timestamp(d), "modal_price": float(p)}
+            for d, p in zip(self.dates, self.prices)
+        ]
+
+
+class PriceIndex:
+
+    def __init__(self, store=None):
+
+        self._store = store
+
+        self._lock = threading.Lock()
+
+        self._series = {}
+        self._by_crop = {}
+        self._sig = None
+        self.version = None
+        self.rows = 0
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    def _signature(self):
+
+        try:
+            st = os.stat(self.store.version_path)
+            return (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def refresh(self):
+        """
+        Rebuild if the store changed. Returns True when rebuilt.
+        """
+
+        sig = self._signature()
+
+        if sig == self._sig and self.version is not None:
+            return False
+
+        with self._lock:
+
+            # another thread may have rebuilt while we waited
+            if sig == self._sig and self.version is not None:
+                return False
+
+            version = self.store.version().get("version", 0)
+
+            df = self.store.read(columns=["date", "crop", "mandi"] + VALUE_COLS)
+
+            self._build(df)
+
+            self._sig = sig
+            self.version = version
+
+        print(f"📈 Price index v{version}: {self.rows} rows, {len(self._series)} series")
+
+        return True
+
+    def _build(self, df):
+
+        df = (
+            df.dropna(subset=["date", "crop", "mandi", "modal_price"])
+            .sort_values(["crop", "mandi", "date"], kind="stable")
+            .drop_duplicates(["crop", "mandi", "date"], keep="last")
+        )
+
+        dates = df["date"].to_numpy(dtype="datetime64[D]")
+
+        values = {
+            col: df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            for col in VALUE_COLS
+        }
+
+        crops = df["crop"].to_numpy()
+        mandis = df["mandi"].to_numpy()
+
+        # series boundaries in the sorted frame
+        if len(df):
+            change = (crops[1:] != crops[:-1]) | (mandis[1:] != mandis[:-1])
+            starts = np.concatenate([[0], np.flatnonzero(change) + 1])
+        else:
+            starts = np.array([], dtype=np.int64)
+
+        ends = np.append(starts[1:], len(df))
+
+        series = {}
+        by_crop = {}
+
+        for lo, hi in zip(starts, ends):
+
+            crop, mandi = crops[lo], mandis[lo]
+
+            series[(crop, mandi)] = PriceSeries(
+                crop,
+                mandi,
+                dates[lo:hi],
+                {k: v[lo:hi] for k, v in values.items()}
+            )
+
+            by_crop.setdefault(crop, []).append(mandi)
+
+        # swap in one assignment; readers keep the old maps meanwhile
+        self._series, self._by_crop = series, by_crop
+        self.rows = len(df)
+
+    # ==================================================
+    # QUERIES
+    # ==================================================
+
+    def get(self, crop, mandi):
+
+        self.refresh()
+
+        return self._series.get((crop, mandi))
+
+    def tail(self, crop, mandi, n):
+
+        s = self.get(crop, mandi)
+
+        return None if s is None else s.tail(n)
+
+    def between(self, crop, mandi, start=None, end=None):
+
+        s = self.get(crop, mandi)
+
+        return None if s is None else s.between(start, end)
+
+    def mandis(self, crop, contains=None):
+        """
+        Mandis for a crop, optionally filtered by a
+        case-insensitive substring
+        """
+
+        self.refresh()
+
+        names = self._by_crop.get(crop, [])
+
+        if contains:
+            needle = contains.lower()
+            names = [m for m in names if needle in m.lower()]
+
+        return names
+
+    def pairs(self):
+
+        self.refresh()
+
+        return list(self._series)
+
+    def status(self):
+        return {
+            "version": self.version,
+            "rows": self.rows,
+            "series": len(self._series),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_price_index():
+    """
+    Process-wide index over get_store()
+    """
+
+    global _index
+
+    with _index_lock:
+
+        if _index is None:
+            _index = PriceIndex()
+
+        return _index
@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+import joblib
+
+from ml.encoding import CategoryEncoder
+
+
+# ======================================================
+# VERSIONED MODEL REGISTRY
+# ======================================================
+# Train once, persist the fitted model together with a
+# fingerprint of the data it was built from, and only
+# retrain (in the background) when that data changes --
+# at most once per RETRAIN_MIN_SECONDS, so a stream of
+# small sync appends does not mean a retrain per batch.
+
+MODELS_DIR = os.path.join(
+    os.path.dirname(__file__),
+    "models"
+)
+
+KEEP_VERSIONS = 3
+
+RETRAIN_MIN_SECONDS = int(os.getenv("MODEL_RETRAIN_MIN_SECONDS", "900"))
+
+
+def file_fingerprint(path: str):
+    """
+    sha256 of the file contents (None if file missing)
+    """
+
+    if not os.path.exists(path):
+        return None
+
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+class ModelBundle:
+    """
+    Everything one request needs, swapped in as a unit
+    """
+
+    __slots__ = (
+        "model", "encoders", "fingerprint", "version", "trained_at"
+    )
+
+    def __init__(self, model, encoders, fingerprint, version, trained_at):
+        self.model = model
+        self.encoders = encoders
+        self.fingerprint = fingerprint
+        self.version = version
+        self.trained_at = trained_at
+
+
+class ModelRegistry:
+
+    def __init__(self, name, data_path, load_data, train, fingerprint=None,
+                 min_interval=RETRAIN_MIN_SECONDS):
+
+        self.name = name
+        self.data_path = data_path
+
+        # load_data(path) -> df
+        # train(df, previous_encoders) -> (fitted model, encoders)
+        self._load_data = load_data
+        self._train = train
+
+        # fingerprint() -> str, defaults to hashing data_path
+        self._fingerprint = fingerprint or (
+            lambda: file_fingerprint(self.data_path)
+        )
+
+        self.dir = os.path.join(MODELS_DIR, name)
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._training = False
+
+        # debounce: background retrains start at most this often
+        self.min_interval = min_interval
+        self._last_start = None
+
+        # cheap change detection (mtime + size) before hashing
+        self._stat = None
+        self._last_error = None
+
+    # ==================================================
+    # MANIFEST
+    # ==================================================
+
+    def _read_manifest(self):
+
+        if not os.path.exists(self.manifest_path):
+            return {"current": None, "versions": []}
+
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+
+        except Exception:
+            return {"current": None, "versions": []}
+
+    def _write_manifest(self, manifest):
+
+        os.makedirs(self.dir, exist_ok=True)
+
+        tmp = self.manifest_path + ".tmp"
+
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(tmp, self.manifest_path)
+
+    def _artifact_path(self, version):
+        return os.path.join(self.dir, f"v{version}.joblib")
+
+    # ==================================================
+    # STAT CHECK
+    # ==================================================
+
+    def _stat_key(self):
+
+        try:
+            st = os.stat(self.data_path)
+            return (st.st_mtime_ns, st.st_size)
+
+        except OSError:
+            return None
+
+    # ==================================================
+    # LOAD (STARTUP)
+    # ==================================================
+
+    def load(self):
+        """
+        Load the persisted model for the current data,
+        train synchronously only if nothing is on disk.
+        """
+
+        self._stat = self._stat_key()
+        fingerprint = self._fingerprint()
+
+        manifest = self._read_manifest()
+
+        entry = None
+
+        for v in manifest.get("versions", []):
+            if v["version"] == manifest.get("current"):
+                entry = v
+
+        if entry is not None:
+
+            try:
+                artifact = joblib.load(self._artifact_path(entry["version"]))
+
+                if "encoders" not in artifact:
+                    raise ValueError("artifact has no encoder vocabulary")
+
+                self._bundle = ModelBundle(
+                    model=artifact["model"],
+                    encoders={
+                        col: CategoryEncoder.from_dict(vocab)
+                        for col, vocab in artifact["encoders"].items()
+                    },
+                    fingerprint=entry["fingerprint"],
+                    version=entry["version"],
+                    trained_at=entry["trained_at"],
+                )
+
+                print(f"✅ {self.name} v{entry['version']} loaded from disk")
+
+            except Exception as e:
+                print(f"❌ {self.name} artifact load failed:", e)
+
+        if self._bundle is None:
+            self._retrain(fingerprint)
+
+        elif self._bundle.fingerprint != fingerprint:
+            # serve the stale model while the new one builds
+            self._start_background(fingerprint)
+
+        return self._bundle
+
+    # ==================================================
+    # ACCESS
+    # ==================================================
+
+    def current(self):
+        return self._bundle
+
+    @property
+    def training(self):
+        return self._training
+
+    def status(self):
+
+        b = self._bundle
+
+        return {
+            "name": self.name,
+            "version": b.version if b else None,
+            "fingerprint": b.fingerprint if b else None,
+            "trained_at": b.trained_at if b else None,
+            "training": self._training,
+            "retrain_min_seconds": self.min_interval,
+            "last_error": self._last_error,
+        }
+
+    # ==================================================
+    # REFRESH (CHEAP, PER REQUEST)
+    # ==================================================
+
+    def refresh(self):
+        """
+        Start a background retrain if the data changed.
+        Never blocks the caller.
+        """
+
+        stat = self._stat_key()
+
+        if self._bundle is not None and stat == self._stat:
+            return False
+
+        # too soon after the last retrain: the stat stays
+        # unrecorded, so a refresh after the window picks it up
+        if not self._due():
+            return False
+
+        fingerprint = self._fingerprint()
+
+        if self._bundle is not None and fingerprint == self._bundle.fingerprint:
+            self._stat = stat
+            return False
+
+        # only remember the stat once a retrain owns it; if one is
+        # already running, it re-checks the data when it finishes
+        if not self._start_background(fingerprint):
+            return False
+
+        self._stat = stat
+
+        return True
+
+    def _due(self):
+
+        return (
+            self._bundle is None
+            or self._last_start is None
+            or time.monotonic() - self._last_start >= self.min_interval
+        )
+
+    def _start_background(self, fingerprint):
+
+        with self._lock:
+
+            if self._training or not self._due():
+                return False
+
+            self._training = True
+            self._last_start = time.monotonic()
+
+        threading.Thread(
+            target=self._retrain_background,
+            args=(fingerprint,),
+            daemon=True,
+            name=f"{self.name}-retrain",
+        ).start()
+
+        return True
+
+    def _retrain_background(self, fingerprint):
+
+        try:
+            self._retrain(fingerprint)
+
+        finally:
+            self._training = False
+
+        # data changed while training: go again once the debounce
+        # window allows (a failed build of the same data is not
+        # retried here; otherwise the next refresh() starts it)
+        stat = self._stat_key()
+        latest = self._fingerprint()
+
+        if latest != fingerprint and self._start_background(latest):
+            self._stat = stat
+
+    # ==================================================
+    # TRAIN + PERSIST
+    # ==================================================
+
+    def _retrain(self, fingerprint):
+
+        previous = self._bundle.encoders if self._bundle else None
+
+        try:
+            data = self._load_data(self.data_path)
+            model, encoders = self._train(data, previous)
+
+        except Exception as e:
+            print(f"❌ {self.name} training failed:", e)
+            self._last_error = str(e)
+            return None
+
+        if model is None:
+            return None
+
+        manifest = self._read_manifest()
+
+        versions = manifest.get("versions", [])
+        version = max([v["version"] for v in versions], default=0) + 1
+
+        trained_at = datetime.now().isoformat()
+
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+
+            path = self._artifact_path(version)
+            tmp = path + ".tmp"
+
+            joblib.dump({
+                "model": model,
+                "encoders": {
+                    col: enc.to_dict() for col, enc in encoders.items()
+                },
+                "fingerprint": fingerprint,
+            }, tmp)
+            os.replace(tmp, path)
+
+            versions.append({
+                "version": version,
+                "fingerprint": fingerprint,
+                "trained_at": trained_at,
+            })
+
+            # prune old artifacts
+            for old in versions[:-KEEP_VERSIONS]:
+                try:
+                    os.remove(self._artifact_path(old["version"]))
+                except OSError:
+                    pass
+
+            manifest = {
+                "current": version,
+                "versions": versions[-KEEP_VERSIONS:],
+            }
+
+            self._write_manifest(manifest)
+
+        except Exception as e:
+            print(f"❌ {self.name} persist failed:", e)
+
+        # atomic swap: in-flight requests keep their old bundle
+        self._bundle = ModelBundle(
+            model=model,
+            encoders=encoders,
+            fingerprint=fingerprint,
+            version=version,
+            trained_at=trained_at,
+        )
+
+        self._last_error = None
+
+        print(f"✅ {self.name} v{version} trained")
+
+        return self._bundle
@@ -0,0 +1,854 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+
+
+# ======================================================
+# COLUMNAR MARKET STORE
+# ======================================================
+# Mandi price history as Parquet, hive-partitioned by crop
+# and mandi, with typed columns and dates parsed once at
+# write time:
+#
+#   ml/data/market_store/crop=Onion/mandi=Pune/part-0.parquet
+#   ml/data/market_store/_version.json
+#
+# Readers push (crop, mandi) down to the partition layout
+# and date ranges down to the Parquet row groups.
+# _version.json is bumped on every write, so "did the data
+# change?" is a single stat() call.
+#
+# Live syncs do not rewrite partitions: append() dedups the
+# batch against a (date, crop, mandi) key index and appends
+# the new rows to _ingest.log (NDJSON, fsync'd). A background
+# compactor folds the log into the partitions, writing each
+# one to a hidden temp file and os.replace()-ing it into
+# place, so a crash never leaves a half-written file.
+#
+# Several processes (uvicorn workers, the sync scheduler,
+# CLI tools) may share one store, so two flock()s guard it:
+#
+#   _store.lock   readers shared; compact() / write() exclusive
+#   _ingest.lock  append() and compact() exclusive
+#
+# always taken in that order. The key index is trusted only
+# while _version.json still holds the version this process
+# last saw; any foreign write makes it rebuild under the locks.
+
+ML_DIR = os.path.dirname(__file__)
+
+STORE_DIR = os.path.join(ML_DIR, "data", "market_store")
+LEGACY_CSV = os.path.join(ML_DIR, "data", "mandi_data.csv")
+
+LOG_NAME = "_ingest.log"
+PART_NAME = "part-0.parquet"
+
+# compact when the log reaches this many rows, or every interval
+COMPACT_ROWS = int(os.getenv("MARKET_STORE_COMPACT_ROWS", "5000"))
+COMPACT_INTERVAL = int(os.getenv("MARKET_STORE_COMPACT_SECONDS", "300"))
+
+KEY_COLS = ["date", "crop", "mandi"]
+
+SCHEMA = pa.schema([
+    ("date", pa.date32()),
+    ("crop", pa.string()),
+    ("mandi", pa.string()),
+    ("modal_price", pa.float64()),
+    ("arrivals", pa.float64()),
+    ("temp", pa.float32()),
+    ("rain", pa.float32()),
+    ("humidity", pa.float32()),
+    ("festival", pa.int8()),
+])
+
+COLUMNS = SCHEMA.names
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("crop", pa.string()), ("mandi", pa.string())]),
+    flavor="hive"
+)
+
+
+def parse_dates(values):
+    """
+    Mixed date formats (CSV + Agmarknet dd/mm/yyyy) -> datetime64
+
+    ISO dates are parsed strictly first: dayfirst=True would
+    otherwise read 2025-12-01 as 12 Jan.
+    """
+
+    values = pd.Series(values)
+
+    dates = pd.to_datetime(values, format="%Y-%m-%d", errors="coerce")
+
+    rest = dates.isna() & values.notna()
+
+    if rest.any():
+        dates[rest] = pd.to_datetime(
+            values[rest],
+            format="mixed",
+            dayfirst=True,
+            errors="coerce"
+        )
+
+    return dates
+
+
+def normalize_frame(df: pd.DataFrame):
+    """
+    Coerce any incoming rows to the store schema
+    """
+
+    df = df.copy()
+
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = parse_dates(df["date"])
+
+    df = df.dropna(subset=KEY_COLS)
+
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = 0
+
+    df["date"] = df["date"].dt.normalize()
+    df["crop"] = df["crop"].astype(str).str.strip()
+    df["mandi"] = df["mandi"].astype(str).str.strip()
+
+    for col in ["modal_price", "arrivals", "temp", "rain", "humidity"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+    df["festival"] = pd.to_numeric(df["festival"], errors="coerce").fillna(0).astype("int8")
+
+    return df[COLUMNS]
+
+
+def row_keys(df):
+    """
+    (date, crop, mandi) keys; dates as ISO strings
+    """
+
+    return list(zip(
+        df["date"].dt.strftime("%Y-%m-%d"),
+        df["crop"],
+        df["mandi"],
+    ))
+
+
+class _FileLock:
+    """
+    Cross-process shared / exclusive lock where the OS supports
+    it (no-op otherwise). Re-entrant per thread; never hold it
+    across a generator yield (it may resume on another thread).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._held = threading.local()
+
+    @contextmanager
+    def hold(self, shared=False):
+
+        mode = getattr(self._held, "mode", None)
+
+        if mode == "ex" or (mode == "sh" and shared):
+            yield
+            return
+
+        if mode == "sh":
+            raise RuntimeError(f"cannot upgrade shared lock on {self.path}")
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with open(self.path, "a") as f:
+
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+            self._held.mode = "sh" if shared else "ex"
+
+            try:
+                yield
+            finally:
+                self._held.mode = None
+
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class MarketStore:
+
+    def __init__(self, root=STORE_DIR):
+
+        self.root = root
+        self.version_path = os.path.join(root, "_version.json")
+        self.log_path = os.path.join(root, LOG_NAME)
+
+        self._store_lock = _FileLock(os.path.join(root, "_store.lock"))
+        self._ingest_lock = _FileLock(os.path.join(root, "_ingest.lock"))
+
+        self._lock = threading.RLock()
+
+        self._series = None
+        self._series_version = None
+
+        # (date, crop, mandi) of every stored row, built lazily;
+        # valid only while the store is at _keys_version
+        self._keys = None
+        self._keys_version = None
+
+        # (log file (size, mtime), parsed log rows)
+        self._log_cache = (None, None)
+
+        self._wake = threading.Event()
+        self._compactor = None
+
+    # ==================================================
+    # VERSION
+    # ==================================================
+
+    def exists(self):
+        return os.path.exists(self.version_path)
+
+    def version(self):
+
+        try:
+            with open(self.version_path, "r") as f:
+                return json.load(f)
+
+        except Exception:
+            return {"version": 0, "updated_at": None}
+
+    def fingerprint(self):
+
+        if not self.exists():
+            return None
+
+        with open(self.version_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _bump_version(self, rows_written):
+
+        info = self.version()
+
+        info = {
+            "version": info.get("version", 0) + 1,
+            "updated_at": datetime.now().isoformat(),
+            "rows_written": rows_written,
+        }
+
+        tmp = self.version_path + ".tmp"
+
+        with open(tmp, "w") as f:
+            json.dump(info, f)
+
+        os.replace(tmp, self.version_path)
+
+        return info
+
+    # ==================================================
+    # READ
+    # ==================================================
+
+    def _dataset(self):
+        return ds.dataset(
+            self.root,
+            format="parquet",
+            schema=SCHEMA,          # also valid before the first compaction
+            partitioning=PARTITIONING,
+        )
+
+    def read(self, crop=None, mandi=None, start=None, end=None, columns=None):
+        """
+        crop / mandi: value or list of values (partition pruning)
+        start / end: inclusive date bounds (row-group pushdown)
+        """
+
+        if not self.exists():
+            return pd.DataFrame(columns=COLUMNS)
+
+        columns = columns or COLUMNS
+
+        expr = self._filter_expr(crop, mandi, start, end)
+
+        # partitions and log seen at one point between compactions
+        with self._store_lock.hold(shared=True):
+
+            table = self._dataset().to_table(filter=expr, columns=columns)
+
+            # rows not compacted yet
+            log = self._log_rows(crop, mandi, start, end)
+
+        df = table.to_pandas()
+
+        if "date" in df.columns:
+            df["date"] = pd.to_datetime(df["date"])
+
+        if not log.empty:
+            df = pd.concat([df, log[columns]], ignore_index=True)
+
+        return df
+
+    def iter_batches(self, crop=None, mandi=None, start=None, end=None,
+                     columns=None, batch_size=10_000):
+        """
+        Same filters as read(), yielded as DataFrames of at most
+        batch_size rows: memory stays flat however much matches.
+        Partition rows first, then uncompacted log rows.
+
+        The partition files are opened and the log read under the
+        store lock; the stream then reads those open files, so a
+        compaction meanwhile neither waits for it nor shows it a
+        half-moved log.
+        """
+
+        if not self.exists():
+            return
+
+        columns = columns or COLUMNS
+
+        expr = self._filter_expr(crop, mandi, start, end)
+
+        fmt = ds.ParquetFileFormat()
+
+        files = []
+
+        try:
+
+            with self._store_lock.hold(shared=True):
+
+                fragments = []
+
+                for frag in self._dataset().get_fragments(filter=expr):
+
+                    f = pa.OSFile(frag.path)
+                    files.append(f)
+
+                    fragments.append(fmt.make_fragment(
+                        f, partition_expression=frag.partition_expression
+                    ))
+
+                log = self._log_rows(crop, mandi, start, end)
+
+            for frag in fragments:
+
+                for batch in frag.to_batches(
+                    schema=SCHEMA,
+                    filter=expr,
+                    columns=columns,
+                    batch_size=batch_size,
+                ):
+
+                    if batch.num_rows == 0:
+                        continue
+
+                    df = batch.to_pandas()
+
+                    if "date" in df.columns:
+                        df["date"] = pd.to_datetime(df["date"])
+
+                    yield df
+
+            for i in range(0, len(log), batch_size):
+                yield log[columns].iloc[i:i + batch_size]
+
+        finally:
+            for f in files:
+                f.close()
+
+    @staticmethod
+    def _filter_expr(crop=None, mandi=None, start=None, end=None):
+        """
+        crop / mandi -> partition pruning, dates -> row-group pushdown
+        """
+
+        expr = None
+
+        def _and(e):
+            return e if expr is None else expr & e
+
+        for col, value in (("crop", crop), ("mandi", mandi)):
+
+            if value is None:
+                continue
+
+            if isinstance(value, (list, tuple, set)):
+                expr = _and(ds.field(col).isin(list(value)))
+            else:
+                expr = _and(ds.field(col) == value)
+
+        if start is not None:
+            expr = _and(ds.field("date") >= pd.Timestamp(start).date())
+
+        if end is not None:
+            expr = _and(ds.field("date") <= pd.Timestamp(end).date())
+
+        return expr
+
+    def _log_rows(self, crop=None, mandi=None, start=None, end=None):
+
+        log = self._log_frame()
+
+        if log.empty:
+            return log
+
+        mask = pd.Series(True, index=log.index)
+
+        for col, value in (("crop", crop), ("mandi", mandi)):
+
+            if value is None:
+                continue
+
+            if isinstance(value, (list, tuple, set)):
+                mask &= log[col].isin(list(value))
+            else:
+                mask &= log[col] == value
+
+        if start is not None:
+            mask &= log["date"] >= pd.Timestamp(start)
+
+        if end is not None:
+            mask &= log["date"] <= pd.Timestamp(end)
+
+        return log.loc[mask]
+
+    def series(self):
+        """
+        [(crop, mandi)] from the partition layout (cached per version)
+        """
+
+        version = self.version().get("version")
+
+        if self._series is not None and self._series_version == version:
+            return self._series
+
+        pairs = set()
+
+        with self._store_lock.hold(shared=True):
+
+            if self.exists():
+                for frag in self._dataset().get_fragments():
+                    keys = ds.get_partition_keys(frag.partition_expression)
+                    pairs.add((keys.get("crop"), keys.get("mandi")))
+
+            log = self._log_frame()
+
+        if not log.empty:
+            pairs.update(zip(log["crop"], log["mandi"]))
+
+        self._series = sorted(pairs)
+        self._series_version = version
+
+        return self._series
+
+    # ==================================================
+    # PARTITION FILES
+    # ==================================================
+
+    def _partition_dir(self, crop, mandi):
+        return os.path.join(
+            self.root,
+            f"crop={quote(crop, safe='')}",
+            f"mandi={quote(mandi, safe='')}",
+        )
+
+    def _read_partition(self, crop, mandi):
+
+        path = os.path.join(self._partition_dir(crop, mandi), PART_NAME)
+
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=COLUMNS)
+
+        df = pq.read_table(path).to_pandas()
+
+        df["date"] = pd.to_datetime(df["date"])
+        df["crop"] = crop
+        df["mandi"] = mandi
+
+        return df[COLUMNS]
+
+    def _write_partition(self, crop, mandi, df):
+        """
+        Atomic: hidden temp file (ignored by readers) + os.replace
+        """
+
+        folder = self._partition_dir(crop, mandi)
+        os.makedirs(folder, exist_ok=True)
+
+        table = pa.Table.from_pandas(
+            normalize_frame(df).sort_values("date"),
+            schema=SCHEMA,
+            preserve_index=False
+        ).drop_columns(["crop", "mandi"])
+
+        path = os.path.join(folder, PART_NAME)
+        tmp = os.path.join(folder, f".{PART_NAME}.tmp")
+
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    def _merge_partitions(self, new):
+        """
+        Fold rows into their partitions; stored rows win on key clashes
+        """
+
+        for (crop, mandi), g in new.groupby(["crop", "mandi"], sort=False):
+
+            merged = pd.concat(
+                [self._read_partition(crop, mandi), g],
+                ignore_index=True
+            )
+
+            merged = merged.drop_duplicates(KEY_COLS, keep="first")
+
+            self._write_partition(crop, mandi, merged)
+
+    # ==================================================
+    # INGESTION LOG
+    # ==================================================
+
+    def _log_frame(self):
+        """
+        Uncompacted rows (re-parsed only when the log changes)
+        """
+
+        try:
+            st = os.stat(self.log_path)
+            sig = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            sig = None
+
+        cached_sig, cached = self._log_cache
+
+        if sig == cached_sig and cached is not None:
+            return cached
+
+        rows = []
+
+        if sig is not None:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        # torn last line after a crash
+                        continue
+
+        df = normalize_frame(pd.DataFrame(rows, columns=COLUMNS))
+
+        # one assignment: concurrent readers never see a mixed pair
+        self._log_cache = (sig, df)
+
+        return df
+
+    def _log_ends_clean(self):
+
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b"\n"
+
+        except OSError:
+            # missing or empty log
+            return True
+
+    def _ensure_index(self):
+        """
+        Key index of the store as it is on disk now. Call with the
+        store lock (any mode) and the ingest lock held, so no one
+        can write while it is checked or rebuilt.
+        """
+
+        version = self.version().get("version", 0)
+
+        if self._keys is not None and self._keys_version == version:
+            return self._keys
+
+        keys = set()
+
+        if self.exists():
+            base = self._dataset().to_table(columns=KEY_COLS).to_pandas()
+            base["date"] = pd.to_datetime(base["date"])
+            keys.update(row_keys(base))
+
+        keys.update(row_keys(self._log_frame()))
+
+        self._keys = keys
+        self._keys_version = version
+
+        return keys
+
+    def append(self, df: pd.DataFrame):
+        """
+        Append-only ingestion: rows whose (date, crop, mandi) is
+        already stored are skipped. Cost is O(batch) unless another
+        process wrote since our last look (index rebuild).
+        Returns number of new rows.
+        """
+
+        new = normalize_frame(df)
+
+        if new.empty:
+            return 0
+
+        with self._lock, \
+                self._store_lock.hold(shared=True), \
+                self._ingest_lock.hold():
+
+            keys = self._ensure_index()
+
+            batch = row_keys(new)
+
+            fresh = []
+            seen = set()
+
+            for i, key in enumerate(batch):
+                if key not in keys and key not in seen:
+                    seen.add(key)
+                    fresh.append(i)
+
+            if not fresh:
+                return 0
+
+            new = new.iloc[fresh]
+
+            out = new.assign(date=new["date"].dt.strftime("%Y-%m-%d"))
+
+            payload = "".join(
+                json.dumps(r) + "\n" for r in out.to_dict("records")
+            )
+
+            # never glue a record onto a torn line from a crash
+            if not self._log_ends_clean():
+                payload = "\n" + payload
+
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+            keys.update(seen)
+
+            self._keys_version = self._bump_version(len(new))["version"]
+
+            if len(self._log_frame()) >= COMPACT_ROWS:
+                self._wake.set()
+
+        return len(new)
+
+    # ==================================================
+    # COMPACTION
+    # ==================================================
+
+    def compact(self):
+        """
+        Fold the ingestion log into the partitions. Returns rows moved.
+        """
+
+        with self._lock, \
+                self._store_lock.hold(), \
+                self._ingest_lock.hold():
+
+            if not os.path.exists(self.log_path):
+                return 0
+
+            with open(self.log_path, "rb") as f:
+                snapshot = f.read()
+
+            # only whole lines; a torn tail stays for next time
+            cut = snapshot.rfind(b"\n") + 1
+
+            rows = []
+
+            for line in snapshot[:cut].splitlines():
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue
+
+            if rows:
+                self._merge_partitions(
+                    normalize_frame(pd.DataFrame(rows, columns=COLUMNS))
+                )
+
+            # drop the compacted prefix atomically
+            with open(self.log_path, "rb") as f:
+                f.seek(cut)
+                rest = f.read()
+
+            tmp = self.log_path + ".tmp"
+
+            with open(tmp, "wb") as f:
+                f.write(rest)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmp, self.log_path)
+
+            self._log_cache = (None, None)
+
+        if rows:
+            print(f"🗜️ Market store compacted {len(rows)} rows")
+
+        return len(rows)
+
+    def _compact_loop(self):
+
+        while True:
+
+            self._wake.wait(COMPACT_INTERVAL)
+            self._wake.clear()
+
+            try:
+                self.compact()
+            except Exception as e:
+                print("❌ Compaction failed:", e)
+
+    def start_compactor(self):
+
+        if self._compactor is not None:
+            return
+
+        self._compactor = threading.Thread(
+            target=self._compact_loop,
+            daemon=True,
+            name="market-store-compactor",
+        )
+
+        self._compactor.start()
+
+    # ==================================================
+    # BULK WRITE (UPSERT BY PARTITION)
+    # ==================================================
+
+    def write(self, df: pd.DataFrame):
+        """
+        Bulk upsert straight into the partitions (migration, backfills):
+        incoming rows replace stored rows with the same key.
+        Returns number of incoming rows stored.
+        """
+
+        new = normalize_frame(df)
+
+        if new.empty:
+            return 0
+
+        new = new.drop_duplicates(KEY_COLS, keep="last")
+
+        with self._lock, self._store_lock.hold():
+
+            # pending log rows go first so they are not shadowed
+            self.compact()
+
+            for (crop, mandi), g in new.groupby(["crop", "mandi"], sort=False):
+
+                merged = pd.concat(
+                    [self._read_partition(crop, mandi), g],
+                    ignore_index=True
+                )
+
+                merged = merged.drop_duplicates(KEY_COLS, keep="last")
+
+                self._write_partition(crop, mandi, merged)
+
+            version = self._bump_version(len(new))["version"]
+
+            if self._keys is not None and self._keys_version == version - 1:
+                self._keys.update(row_keys(new))
+                self._keys_version = version
+
+        return len(new)
+
+    # ==================================================
+    # MIGRATION
+    # ==================================================
+
+    def migrate_csv(self, csv_path=LEGACY_CSV, replace=False):
+        """
+        One-shot conversion of the legacy mandi_data.csv
+        """
+
+        if replace and os.path.exists(self.root):
+            shutil.rmtree(self.root)
+
+        df = pd.read_csv(csv_path)
+
+        rows = self.write(df)
+
+        print(f"✅ Migrated {rows} rows from {csv_path} -> {self.root}")
+
+        return rows
+
+
+# ======================================================
+# SHARED INSTANCE
+# ======================================================
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Process-wide store. Migrates the legacy CSV on first use
+    if the store has not been created yet.
+    """
+
+    global _store
+
+    with _store_lock:
+
+        if _store is None:
+
+            _store = MarketStore()
+
+            if not _store.exists() and os.path.exists(LEGACY_CSV):
+                _store.migrate_csv(LEGACY_CSV)
+
+            _store.start_compactor()
+
+        return _store
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Market store tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    mig = sub.add_parser("migrate", help="convert mandi_data.csv to the columnar store")
+    mig.add_argument("--csv", default=LEGACY_CSV)
+    mig.add_argument("--replace", action="store_true", help="drop the existing store first")
+
+    sub.add_parser("info", help="show store version and series")
+    sub.add_parser("compact", help="fold the ingestion log into the partitions")
+
+    args = parser.parse_args()
+
+    store = MarketStore()
+
+    if args.cmd == "migrate":
+        store.migrate_csv(args.csv, replace=args.replace)
+
+    elif args.cmd == "compact":
+        print(store.compact(), "rows compacted")
+
+    elif args.cmd == "info":
+        print(store.version())
+        for crop, mandi in store.series():
+            print(f"   {crop} | {mandi}")
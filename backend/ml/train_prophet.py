@@ -1,7 +1,29 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
 import joblib
 from prophet import Prophet
 
+from ml.store import get_store, parse_dates
+
+ML_DIR = os.path.dirname(__file__)
+
+PROPHET_DIR = os.path.join(ML_DIR, "models", "prophet")
+MANIFEST_PATH = os.path.join(PROPHET_DIR, "manifest.json")
+
+MIN_ROWS = 5
+
+# bump when model settings change so every series refits
+MODEL_SPEC = "prophet:yearly+weekly:v1"
+
+
 def train_prophet(df: pd.DataFrame, out="ml/models/prophet.joblib"):
     prophet_df = df[["date", "modal_price"]].rename(columns={"date":"ds","modal_price":"y"})
     model = Prophet(yearly_seasonality=True, weekly_seasonality=True)
@@ -9,8 +31,261 @@ def train_prophet(df: pd.DataFrame, out="ml/models/prophet.joblib"):
     joblib.dump(model, out)
     print("✅ Prophet model saved:", out)
 
+
+# ======================================================
+# PER-SERIES TRAINING
+# ======================================================
+# One Prophet model per (crop, mandi), fitted across a
+# process pool and written to a sharded directory:
+#
+#   models/prophet/<shard>/<crop>__<mandi>-<hash>.joblib
+#   models/prophet/manifest.json
+#
+# The hash is of the raw (crop, mandi) pair, so two series
+# whose names slug alike never share a file. Series whose
+# input hash matches the manifest are skipped; model files
+# the new manifest no longer references are deleted.
+
+def series_key(crop, mandi):
+    return f"{crop}|{mandi}"
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+
+
+def series_relpath(crop, mandi):
+
+    digest = hashlib.sha1(series_key(crop, mandi).encode()).hexdigest()
+
+    name = f"{_slug(crop)}__{_slug(mandi)}-{digest[:12]}"
+
+    return os.path.join(digest[:2], f"{name}.joblib")
+
+
+def series_hash(g: pd.DataFrame):
+
+    h = hashlib.sha256(MODEL_SPEC.encode())
+
+    h.update(
+        pd.util.hash_pandas_object(
+            g[["date", "modal_price"]], index=False
+        ).to_numpy().tobytes()
+    )
+
+    return h.hexdigest()
+
+
+def read_manifest():
+
+    if not os.path.exists(MANIFEST_PATH):
+        return {"series": {}}
+
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+
+    except Exception:
+        return {"series": {}}
+
+
+def _write_manifest(manifest):
+
+    os.makedirs(PROPHET_DIR, exist_ok=True)
+
+    tmp = MANIFEST_PATH + ".tmp"
+
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def prune_models(entries):
+    """
+    Delete model files (and empty shards) the manifest does
+    not reference. Returns files removed.
+    """
+
+    keep = {os.path.normpath(e["path"]) for e in entries.values()}
+
+    removed = 0
+
+    if not os.path.isdir(PROPHET_DIR):
+        return removed
+
+    for shard in os.listdir(PROPHET_DIR):
+
+        folder = os.path.join(PROPHET_DIR, shard)
+
+        if not os.path.isdir(folder):
+            continue
+
+        for name in os.listdir(folder):
+
+            rel = os.path.normpath(os.path.join(shard, name))
+
+            if (name.endswith(".joblib") or name.endswith(".tmp")) and rel not in keep:
+                os.remove(os.path.join(folder, name))
+                removed += 1
+
+        if not os.listdir(folder):
+            os.rmdir(folder)
+
+    return removed
+
+
+def _fit_series(key, g, out):
+    """
+    Runs in a worker process
+    """
+
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+    start = time.time()
+
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+
+    tmp = out + ".tmp"
+
+    train_prophet(g, out=tmp)
+    os.replace(tmp, out)
+
+    return key, round(time.time() - start, 2)
+
+
+def load_series_frame(csv_path=None):
+    """
+    Price history from the market store (or a CSV override)
+    """
+
+    if csv_path:
+        df = pd.read_csv(csv_path)
+        df["date"] = parse_dates(df["date"])
+    else:
+        df = get_store().read(columns=["date", "crop", "mandi", "modal_price"])
+
+    df = df.dropna(subset=["date", "modal_price"])
+
+    return df.sort_values("date")
+
+
+def train_all(df: pd.DataFrame, workers=None, force=False):
+    """
+    Fit every changed (crop, mandi) series in parallel
+    """
+
+    manifest = read_manifest()
+    known = manifest.get("series", {})
+
+    jobs = {}
+    entries = {}
+
+    for (crop, mandi), g in df.groupby(["crop", "mandi"], sort=True):
+
+        if len(g) < MIN_ROWS:
+            continue
+
+        key = series_key(crop, mandi)
+        data_hash = series_hash(g)
+        rel = series_relpath(crop, mandi)
+
+        entries[key] = {
+            "crop": crop,
+            "mandi": mandi,
+            "path": rel,
+            "rows": len(g),
+            "data_hash": data_hash,
+            "last_date": g["date"].max().strftime("%Y-%m-%d"),
+        }
+
+        old = known.get(key)
+
+        # files from the old slug-only naming may have been
+        # overwritten by a colliding series: refit those once
+        if (
+            not force
+            and old is not None
+            and old.get("data_hash") == data_hash
+            and old.get("path") == rel
+            and os.path.exists(os.path.join(PROPHET_DIR, rel))
+        ):
+            entries[key] = old
+            continue
+
+        jobs[key] = (g[["date", "modal_price"]], os.path.join(PROPHET_DIR, rel))
+
+    unchanged = len(entries) - len(jobs)
+
+    print(f"📊 Series: {len(entries)} | to train: {len(jobs)} | unchanged: {unchanged}")
+
+    failed = []
+
+    if jobs:
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+
+            futures = {
+                pool.submit(_fit_series, key, g, out): key
+                for key, (g, out) in jobs.items()
+            }
+
+            for fut in as_completed(futures):
+
+                key = futures[fut]
+
+                try:
+                    _, seconds = fut.result()
+
+                    entries[key]["trained_at"] = pd.Timestamp.now().isoformat()
+                    entries[key]["train_seconds"] = seconds
+
+                    print(f"✅ {key} ({seconds}s)")
+
+                except Exception as e:
+                    print(f"❌ {key} -> {e}")
+                    failed.append(key)
+
+                    # keep the previous model (if any) for this series
+                    if key in known:
+                        entries[key] = known[key]
+                    else:
+                        entries.pop(key, None)
+
+    manifest = {
+        "model_spec": MODEL_SPEC,
+        "updated_at": pd.Timestamp.now().isoformat(),
+        "series": entries,
+    }
+
+    _write_manifest(manifest)
+
+    # only after the manifest stops pointing at them
+    pruned = prune_models(entries)
+
+    return {
+        "series": len(entries),
+        "trained": len(jobs) - len(failed),
+        "unchanged": unchanged,
+        "failed": failed,
+        "pruned": pruned,
+    }
+
+
 if __name__ == "__main__":
-    df = pd.read_csv("ml/data/mandi_data.csv")
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date")
-    train_prophet(df)
+
+    parser = argparse.ArgumentParser(description="Train per-series Prophet models")
+    parser.add_argument("--csv", help="train from a CSV instead of the market store")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="refit unchanged series too")
+    parser.add_argument("--global", dest="global_model", action="store_true",
+                        help="also refit the shared fallback model (prophet.joblib)")
+
+    args = parser.parse_args()
+
+    df = load_series_frame(args.csv)
+
+    print(train_all(df, workers=args.workers, force=args.force))
+
+    if args.global_model:
+        train_prophet(df, out=os.path.join(ML_DIR, "models", "prophet.joblib"))
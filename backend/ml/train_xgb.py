@@ -1,42 +1,250 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
 import pandas as pd
 import joblib
+from joblib import Parallel, delayed
 from xgboost import XGBRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error
-from ml.features import create_features
-
-FEATURE_COLS = [
-    "arrivals", "temp", "rain", "humidity", "festival",
-    "day", "month", "weekday", "weekofyear",
-    "price_lag1", "price_lag7", "arrivals_lag1",
-    "price_roll7", "arrivals_roll7"
-]
-
-def train_xgb(csv_path="ml/data/mandi_data.csv", out="ml/models/xgb.joblib"):
-    df = pd.read_csv(csv_path)
-    df = create_features(df)
-
-    X = df[FEATURE_COLS]
-    y = df["modal_price"]
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-
-    model = XGBRegressor(
-        n_estimators=600,
-        learning_rate=0.05,
-        max_depth=6,
-        subsample=0.8,
-        colsample_bytree=0.9
+from sklearn.model_selection import TimeSeriesSplit, ParameterGrid
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
+from ml.features import FeatureStore, FEATURE_COLS
+from ml.price_index import get_price_index
+
+ML_DIR = os.path.dirname(__file__)
+
+XGB_PATH = os.path.join(ML_DIR, "models", "xgb.joblib")
+METRICS_PATH = os.path.join(ML_DIR, "models", "xgb_metrics.json")
+
+MAX_TREES = 600
+EARLY_STOPPING = 50
+
+# searched on top of the fixed settings below
+PARAM_GRID = {
+    "max_depth": [4, 6, 8],
+    "learning_rate": [0.03, 0.05, 0.1],
+    "subsample": [0.8],
+    "colsample_bytree": [0.9],
+}
+
+BASE_PARAMS = {
+    "n_estimators": MAX_TREES,
+    "n_jobs": 1,            # parallelism is across configs
+    "tree_method": "hist",
+}
+
+
+# ======================================================
+# WALK-FORWARD FOLDS
+# ======================================================
+# Folds are cut on calendar dates (not rows), so every
+# series is split at the same point in time and no fold
+# ever trains on the future. The last EARLY_STOP_FRACTION
+# of each training fold's dates is held out for early
+# stopping, so the validation fold only ever scores.
+
+EARLY_STOP_FRACTION = 0.1
+
+
+def walk_forward_folds(dates: pd.Series, n_splits=4):
+    """
+    [(train, stop, valid)] row indices
+    """
+
+    days = np.sort(dates.unique())
+
+    if len(days) <= n_splits:
+        raise ValueError(f"Need more than {n_splits} distinct dates for CV")
+
+    folds = []
+
+    for train_idx, valid_idx in TimeSeriesSplit(n_splits=n_splits).split(days):
+
+        if len(train_idx) < 2:
+            raise ValueError("Not enough dates for an early-stopping split")
+
+        # at least one day on each side of the inner split
+        inner = min(
+            len(train_idx) - 1,
+            max(1, int(round(len(train_idx) * (1 - EARLY_STOP_FRACTION))))
+        )
+
+        fit_end = days[train_idx[inner - 1]]
+        cutoff = days[train_idx[-1]]
+        end = days[valid_idx[-1]]
+
+        train = np.flatnonzero((dates <= fit_end).to_numpy())
+        stop = np.flatnonzero(((dates > fit_end) & (dates <= cutoff)).to_numpy())
+        valid = np.flatnonzero(((dates > cutoff) & (dates <= end)).to_numpy())
+
+        folds.append((train, stop, valid))
+
+    return folds
+
+
+def _evaluate(params, X, y, folds):
+    """
+    Runs in a worker: CV one configuration
+    """
+
+    maes, mapes, iters = [], [], []
+
+    start = time.time()
+
+    for train, stop, valid in folds:
+
+        model = XGBRegressor(**{
+            **BASE_PARAMS,
+            **params,
+            "early_stopping_rounds": EARLY_STOPPING,
+        })
+
+        model.fit(
+            X[train], y[train],
+            eval_set=[(X[stop], y[stop])],
+            verbose=False,
+        )
+
+        preds = model.predict(X[valid])
+
+        maes.append(mean_absolute_error(y[valid], preds))
+        mapes.append(mean_absolute_percentage_error(y[valid], preds) * 100)
+        iters.append(model.best_iteration + 1)
+
+    return {
+        "params": params,
+        "mae": round(float(np.mean(maes)), 2),
+        "mape": round(float(np.mean(mapes)), 2),
+        "n_estimators": int(np.median(iters)),
+        "train_seconds": round(time.time() - start, 2),
+    }
+
+
+def _inference_ms(model, X, rows=1000):
+    """
+    Batch predict latency per `rows` rows (inference cost)
+    """
+
+    batch = X[np.arange(rows) % len(X)]
+
+    start = time.perf_counter()
+    model.predict(batch)
+
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+# ======================================================
+# TRAIN
+# ======================================================
+
+# kept across trainings in this process: each run only
+# featurizes the rows the store gained since the last one
+_features = FeatureStore()
+
+
+def load_training_arrays(csv_path=None):
+    """
+    (X, y, dates) from the market store (or a CSV override)
+    """
+
+    if csv_path:
+        features = FeatureStore.from_frame(pd.read_csv(csv_path))
+    else:
+        features = _features
+        features.sync(get_price_index())
+
+    return features.training_arrays()
+
+
+def train_xgb(
+    csv_path=None,
+    out=XGB_PATH,
+    metrics_out=METRICS_PATH,
+    param_grid=PARAM_GRID,
+    n_splits=4,
+    n_jobs=-1,
+):
+
+    X, y, dates = load_training_arrays(csv_path)
+
+    if len(X) < 20:
+        raise ValueError(f"Not enough feature rows to train XGB ({len(X)})")
+
+    folds = walk_forward_folds(pd.Series(dates), n_splits)
+
+    grid = list(ParameterGrid(param_grid))
+
+    print(f"🔍 {len(grid)} configs x {len(folds)} folds")
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_evaluate)(params, X, y, folds) for params in grid
     )
 
-    model.fit(X_train, y_train)
-    preds = model.predict(X_test)
+    results.sort(key=lambda r: r["mae"])
 
-    mae = mean_absolute_error(y_test, preds)
-    print("✅ XGB MAE:", mae)
+    for r in results:
+        print(f"   MAE {r['mae']:>9} | MAPE {r['mape']:>6}% | trees {r['n_estimators']:>4} | {r['train_seconds']}s | {r['params']}")
+
+    best = results[0]
+
+    # refit the winner on all data with its CV tree count
+    start = time.time()
+
+    model = XGBRegressor(**{
+        **BASE_PARAMS,
+        **best["params"],
+        "n_estimators": best["n_estimators"],
+        "n_jobs": -1,
+    })
+
+    model.fit(X, y)
+
+    best["final_train_seconds"] = round(time.time() - start, 2)
+    best["predict_ms_per_1k"] = _inference_ms(model, X)
+
+    print("✅ XGB best MAE:", best["mae"], "MAPE:", best["mape"])
 
     joblib.dump(model, out)
     print("✅ XGB model saved:", out)
 
+    metrics = {
+        "trained_at": pd.Timestamp.now().isoformat(),
+        "rows": len(X),
+        "folds": len(folds),
+        "features": FEATURE_COLS,
+        "best": best,
+        "results": results,
+    }
+
+    with open(metrics_out, "w") as f:
+        json.dump(metrics, f, indent=2)
+
+    print("✅ XGB metrics saved:", metrics_out)
+
+    return metrics
+
+
 if __name__ == "__main__":
-    train_xgb()
+
+    parser = argparse.ArgumentParser(description="Walk-forward CV + grid search for XGB")
+    parser.add_argument("--csv", help="train from a CSV instead of the market store")
+    parser.add_argument("--splits", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--grid", help="JSON file with a parameter grid")
+
+    args = parser.parse_args()
+
+    grid = PARAM_GRID
+
+    if args.grid:
+        with open(args.grid, "r") as f:
+            grid = json.load(f)
+
+    train_xgb(
+        csv_path=args.csv,
+        param_grid=grid,
+        n_splits=args.splits,
+        n_jobs=args.jobs,
+    )
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# tests import app.* / ml.* the way uvicorn does, from backend/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from ml.analytics import bucket_starts, lttb, ohlc
+
+
+def _days(start, n):
+    return np.arange(np.datetime64(start), np.datetime64(start) + n)
+
+
+def test_ohlc_weekly_buckets():
+
+    # Wed 2025-12-03 .. Tue 2025-12-09: two ISO weeks
+    dates = _days("2025-12-03", 7)
+    prices = np.array([5, 9, 1, 4, 6, 2, 8], dtype=float)
+
+    out = ohlc(dates, prices, "weekly", volume=np.ones(7))
+
+    assert list(out["date"]) == [np.datetime64("2025-12-01"), np.datetime64("2025-12-08")]
+    assert list(out["open"]) == [5, 2]
+    assert list(out["high"]) == [9, 8]
+    assert list(out["low"]) == [1, 2]
+    assert list(out["close"]) == [6, 8]
+    assert list(out["count"]) == [5, 2]
+    assert list(out["volume"]) == [5, 2]
+
+
+def test_monthly_bucket_starts():
+
+    dates = np.array(["2025-11-30", "2025-12-01", "2025-12-31"], dtype="datetime64[D]")
+
+    assert list(bucket_starts(dates, "monthly")) == list(
+        np.array(["2025-11-01", "2025-12-01", "2025-12-01"], dtype="datetime64[D]")
+    )
+
+
+def test_ohlc_empty():
+    assert len(ohlc(np.array([], dtype="datetime64[D]"), [], "daily")["open"]) == 0
+
+
+def test_lttb_keeps_ends_and_peaks():
+
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[[250, 600]] = [50, -40]
+
+    keep = lttb(x, y, 20)
+
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert {250, 600} <= set(keep.tolist())
+
+
+def test_lttb_passthrough_when_small():
+
+    assert list(lttb(range(5), range(5), 10)) == [0, 1, 2, 3, 4]
+    assert list(lttb(range(5), range(5), 2)) == [0, 1, 2, 3, 4]
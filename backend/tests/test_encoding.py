@@ -0,0 +1,35 @@
+import pandas as pd
+
+from ml.encoding import CategoryEncoder, UNKNOWN, fit_encoders
+
+
+def test_codes_in_order_of_appearance():
+
+    enc = CategoryEncoder().fit(["Pune", "Nashik", "Pune", None])
+
+    assert enc.to_dict() == {"Pune": 0, "Nashik": 1}
+    assert enc.encode("Mumbai") == UNKNOWN
+    assert list(enc.transform(["Nashik", "Mumbai"])) == [1, UNKNOWN]
+
+
+def test_refit_keeps_existing_codes():
+
+    old = CategoryEncoder().fit(["Pune", "Nashik"])
+
+    new = fit_encoders(
+        pd.DataFrame({"mandi": ["Solapur", "Nashik", "Pune"]}),
+        ["mandi"],
+        previous={"mandi": old},
+    )["mandi"]
+
+    assert new.to_dict() == {"Pune": 0, "Nashik": 1, "Solapur": 2}
+
+    # the previous encoder is not mutated
+    assert len(old) == 2
+
+
+def test_round_trip():
+
+    enc = CategoryEncoder().fit(["Onion", "Tomato"])
+
+    assert CategoryEncoder.from_dict(enc.to_dict()).to_dict() == enc.to_dict()
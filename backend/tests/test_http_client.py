@@ -0,0 +1,98 @@
+import httpx
+import pytest
+
+import app.services.http_client as hc
+from app.services.http_client import CircuitBreaker, CircuitOpenError, HttpClient, UpstreamError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+
+    now = [1000.0]
+    monkeypatch.setattr(hc.time, "monotonic", lambda: now[0])
+
+    return now
+
+
+def test_breaker_opens_then_lets_one_probe_through(clock):
+
+    b = CircuitBreaker()
+
+    for _ in range(hc.BREAKER_FAILURES):
+        assert b.allow()
+        b.failure()
+
+    assert b.state == "open"
+    assert not b.allow()
+
+    clock[0] += hc.BREAKER_COOLDOWN
+
+    assert b.state == "half-open"
+    assert b.allow()            # the probe
+    assert not b.allow()        # everyone else waits for it
+
+    b.success()
+
+    assert b.state == "closed"
+    assert b.allow()
+
+
+def test_released_probe_frees_the_slot(clock):
+
+    b = CircuitBreaker()
+
+    for _ in range(hc.BREAKER_FAILURES):
+        b.failure()
+
+    clock[0] += hc.BREAKER_COOLDOWN
+
+    assert b.allow()
+    b.release()                 # probe cancelled, no verdict
+    assert b.allow()
+
+
+@pytest.fixture
+def client(monkeypatch):
+
+    monkeypatch.setattr(hc, "BACKOFF_BASE", 0.0)
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.host)
+        status = 503 if request.url.host == "down.test" else 200
+        return httpx.Response(status, json={"ok": status == 200})
+
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    client.calls = calls
+
+    yield client
+
+    client.close()
+
+
+def test_retries_then_opens_circuit(client):
+
+    with pytest.raises(UpstreamError) as err:
+        client.get_json_sync("https://down.test/x", retries=2)
+
+    assert err.value.status_code == 503
+    assert len(client.calls) == 3
+
+    # two more failures reach BREAKER_FAILURES; later calls never leave
+    with pytest.raises(UpstreamError):
+        client.get_json_sync("https://down.test/x", retries=1)
+
+    with pytest.raises(CircuitOpenError):
+        client.get_json_sync("https://down.test/x")
+
+    assert len(client.calls) == hc.BREAKER_FAILURES
+    assert client.status()["down.test"]["circuit"] == "open"
+
+
+def test_other_hosts_unaffected(client):
+
+    with pytest.raises(UpstreamError):
+        client.get_json_sync("https://down.test/x", retries=hc.BREAKER_FAILURES)
+
+    assert client.get_json_sync("https://up.test/y") == {"ok": True}
@@ -0,0 +1,110 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from app.services.agmarknet_batch import RecordBatch, market_key
+from app.routes import mandi
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "agmarknet_onion.json")
+
+
+@pytest.fixture(scope="module")
+def records():
+    with open(FIXTURE) as f:
+        return json.load(f)["records"]
+
+
+def _parse_date(date_str):
+
+    if not date_str:
+        return None
+
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str.strip(), fmt)
+        except ValueError:
+            pass
+
+    return None
+
+
+def old_rank(records, mandis):
+    """
+    best_mandi_today as it was: per mandi, substring match over
+    every record, newest first (stable sort)
+    """
+
+    ranking = []
+
+    for m in mandis:
+
+        needle = mandi.normalize(m["name"])
+
+        rows = [r for r in records if needle in mandi.normalize(r.get("market"))]
+
+        if not rows:
+            ranking.append((m["name"], "No data", None, None))
+            continue
+
+        rows.sort(key=lambda r: _parse_date(r.get("arrival_date")) or datetime.min, reverse=True)
+
+        ranking.append((
+            m["name"], "OK", rows[0].get("arrival_date"),
+            float(rows[0].get("modal_price", 0) or 0),
+        ))
+
+    valid = [x for x in ranking if x[3] not in [None, 0]]
+    best = sorted(valid, key=lambda x: x[3], reverse=True)[0] if valid else None
+
+    return ranking, best
+
+
+def _rows(ranking):
+    return [(r["mandi"], r["status"], r["arrival_date"], r["modal_price"]) for r in ranking]
+
+
+@pytest.mark.parametrize("mandis", [mandi.MANDI_LIST, mandi.NET_MANDIS], ids=["mandi_list", "net_mandis"])
+def test_rank_mandis_matches_old_ranking(records, mandis):
+
+    expected, best = old_rank(records, mandis)
+
+    ranking, top = mandi.rank_mandis(RecordBatch(records), mandis, top=3)
+
+    assert _rows(ranking) == expected
+    assert (_rows(top[:1]) or [None])[0] == best
+
+
+def test_sub_yards_rank_under_their_city(records):
+
+    ranking, _ = mandi.rank_mandis(RecordBatch(records), mandi.MANDI_LIST)
+    pune = ranking[0]
+
+    # newest Pune-family row; the Pune(Moshi) tie wins on payload order
+    newest = [r for r in records if "pune" in r["market"].lower() and r["arrival_date"] == "14/10/2025"]
+
+    assert pune["arrival_date"] == "14/10/2025"
+    assert pune["modal_price"] == float(newest[0]["modal_price"])
+
+
+def test_net_prices_match_rank_mandis(records):
+
+    batch = RecordBatch(records)
+    rows = batch.latest_matching(mandi.NET_NEEDLES)
+    ranking, _ = mandi.rank_mandis(batch, mandi.NET_MANDIS)
+
+    for i, r in zip(rows, ranking):
+        assert (i >= 0) == (r["status"] == "OK")
+
+
+@pytest.mark.parametrize("name, key", [
+    ("Pune(Pimpri)", "pune"),
+    ("  PUNE (Moshi) APMC ", "pune"),
+    ("Binny Mill (F&V), Bangalore", "bangalore"),
+    ("Vashi New Mumbai", "mumbai"),
+    ("Suratgarh", "suratgarh"),
+    (None, ""),
+])
+def test_market_key(name, key):
+    assert market_key(name) == key
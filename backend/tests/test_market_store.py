@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from ml.store import MarketStore
+
+
+def _rows(*rows):
+    return pd.DataFrame(rows, columns=["date", "crop", "mandi", "modal_price"])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MarketStore(str(tmp_path / "market_store"))
+
+
+def test_write_then_read_with_partition_filter(store):
+
+    store.write(_rows(
+        ("2025-12-01", "Onion", "Pune", 2300),
+        ("2025-12-02", "Onion", "Pune", 2350),
+        ("2025-12-01", "Onion", "Nashik", 2100),
+    ))
+
+    df = store.read(crop="Onion", mandi="Pune")
+
+    assert list(df.sort_values("date")["modal_price"]) == [2300, 2350]
+    assert store.version()["version"] == 1
+
+
+def test_write_upserts_on_key(store):
+
+    store.write(_rows(("2025-12-01", "Onion", "Pune", 2300)))
+    store.write(_rows(("01/12/2025", "Onion", "Pune", 2400)))
+
+    df = store.read()
+
+    assert len(df) == 1
+    assert df["modal_price"].iloc[0] == 2400
+
+
+def test_append_dedups_and_is_readable_before_compaction(store):
+
+    store.write(_rows(("2025-12-01", "Onion", "Pune", 2300)))
+
+    added = store.append(_rows(
+        ("2025-12-01", "Onion", "Pune", 9999),     # already stored
+        ("2025-12-02", "Onion", "Pune", 2350),
+        ("2025-12-02", "Onion", "Pune", 2360),     # duplicate in batch
+    ))
+
+    assert added == 1
+    assert store.append(_rows(("2025-12-02", "Onion", "Pune", 1))) == 0
+
+    df = store.read(crop="Onion").sort_values("date")
+
+    assert list(df["modal_price"]) == [2300, 2350]
+
+
+def test_compact_moves_log_into_partitions(store):
+
+    store.append(_rows(
+        ("2025-12-01", "Onion", "Pune", 2300),
+        ("2025-12-01", "Tomato", "Pune", 900),
+    ))
+
+    assert store.compact() == 2
+    assert store.compact() == 0
+
+    df = store.read(start="2025-12-01", end="2025-12-01")
+
+    assert sorted(df["crop"]) == ["Onion", "Tomato"]
+
+    # a fresh instance (another process) sees the same keys
+    assert MarketStore(store.root).append(_rows(("2025-12-01", "Onion", "Pune", 1))) == 0
+
+
+def test_iter_batches_covers_partitions_and_log(store):
+
+    store.write(_rows(*[(f"2025-11-{d:02d}", "Onion", "Pune", d) for d in range(1, 21)]))
+    store.append(_rows(("2025-12-01", "Onion", "Pune", 99)))
+
+    batches = list(store.iter_batches(crop="Onion", batch_size=7))
+
+    assert all(len(b) <= 7 for b in batches)
+    assert sorted(pd.concat(batches)["modal_price"]) == list(range(1, 21)) + [99]
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.store import MarketStore
+from ml.price_index import PriceIndex
+
+
+@pytest.fixture
+def store(tmp_path):
+
+    store = MarketStore(str(tmp_path / "market_store"))
+
+    store.write(pd.DataFrame({
+        "date": ["2025-12-03", "2025-12-01", "2025-12-02", "2025-12-01"],
+        "crop": ["Onion", "Onion", "Onion", "Onion"],
+        "mandi": ["Pune", "Pune", "Pune", "Nashik"],
+        "modal_price": [2400, 2300, 2350, 2100],
+    }))
+
+    return store
+
+
+def test_series_sorted_and_sliced(store):
+
+    index = PriceIndex(store)
+
+    s = index.get("Onion", "Pune")
+
+    assert list(s.prices) == [2300, 2350, 2400]
+    assert list(index.tail("Onion", "Pune", 2).prices) == [2350, 2400]
+    assert list(index.between("Onion", "Pune", "2025-12-02", "2025-12-02").prices) == [2350]
+    assert s.last()["date"] == pd.Timestamp("2025-12-03")
+
+    assert index.get("Onion", "Mumbai") is None
+    assert index.mandis("Onion", contains="NAS") == ["Nashik"]
+
+
+def test_rebuilds_only_when_store_changes(store):
+
+    index = PriceIndex(store)
+
+    assert index.refresh() is True
+    assert index.refresh() is False
+
+    store.append(pd.DataFrame({
+        "date": ["2025-12-04"], "crop": ["Onion"], "mandi": ["Pune"], "modal_price": [2500],
+    }))
+
+    assert index.refresh() is True
+    assert index.get("Onion", "Pune").dates[-1] == np.datetime64("2025-12-04")
+    assert index.status()["rows"] == 5
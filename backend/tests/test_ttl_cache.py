@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+import app.services.ttl_cache as tc
+from app.services.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+
+    now = [1000.0]
+    monkeypatch.setattr(tc.time, "time", lambda: now[0])
+
+    return now
+
+
+def _counter(delay=0.0):
+
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return len(calls)
+
+    return fetch, calls
+
+
+def test_fresh_stale_and_expired(clock):
+
+    cache = TTLCache("t", ttl=10, stale_ttl=20)
+    fetch, calls = _counter()
+
+    async def run():
+
+        assert await cache.get_or_fetch("k", fetch) == 1       # miss
+        assert await cache.get_or_fetch("k", fetch) == 1       # fresh
+
+        clock[0] += 15
+        assert await cache.get_or_fetch("k", fetch) == 1       # stale, refresh starts
+        assert await cache.get_or_fetch("k", fetch) == 1       # no second refresh
+        await asyncio.gather(*cache._tasks)
+
+        assert await cache.get_or_fetch("k", fetch) == 2       # refreshed value
+
+        clock[0] += 31
+        assert await cache.get_or_fetch("k", fetch) == 3       # expired: miss
+
+    asyncio.run(run())
+
+    assert len(calls) == 3
+    assert cache.metrics["refreshes"] == 1
+    assert cache.metrics["stale_hits"] == 2
+
+
+def test_concurrent_misses_share_one_fetch(clock):
+
+    cache = TTLCache("t", ttl=10)
+    fetch, calls = _counter(delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_fetch("k", fetch) for _ in range(5)])
+
+    assert asyncio.run(run()) == [1] * 5
+    assert len(calls) == 1
+    assert cache.metrics["coalesced"] == 4
+
+
+def test_uncacheable_and_failed_fetches_are_not_stored(clock):
+
+    cache = TTLCache("t", ttl=10, cacheable=lambda v: "error" not in v)
+
+    async def bad():
+        return {"error": "upstream"}
+
+    async def boom():
+        raise RuntimeError("down")
+
+    async def run():
+
+        assert await cache.get_or_fetch("k", bad) == {"error": "upstream"}
+        assert cache.backend.get("k") is None
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch("j", boom)
+
+        assert cache.backend.get("j") is None
+
+    asyncio.run(run())
+
+
+def test_failed_refresh_keeps_serving_stale(clock):
+
+    cache = TTLCache("t", ttl=10, stale_ttl=20)
+
+    async def good():
+        return "v1"
+
+    async def boom():
+        raise RuntimeError("down")
+
+    async def run():
+
+        await cache.get_or_fetch("k", good)
+
+        clock[0] += 15
+        assert await cache.get_or_fetch("k", boom) == "v1"
+        await asyncio.gather(*cache._tasks)
+
+        assert await cache.get_or_fetch("k", boom) == "v1"
+        await asyncio.gather(*cache._tasks)
+
+    asyncio.run(run())
+
+    assert cache.metrics["refreshes"] == 2